@@ -1,14 +1,67 @@
+import codecs
+import copy
 import csv
+import hashlib
+import logging
+import operator
+import os
 import re
-from collections import OrderedDict, namedtuple
-from datetime import datetime
-from typing import Dict, List, Optional
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict, defaultdict, namedtuple
+from itertools import islice
+from datetime import date, datetime
+from typing import (
+    TYPE_CHECKING,
+    AsyncIterator,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    TypeVar,
+    Union,
+)
 
 from beancount.core import data, flags
 from beancount.core.amount import Amount
 from beancount.core.number import Decimal
 from beangulp.importer import Importer
 
+from .classification import (
+    LazyPattern,
+    PatternConflict as PatternConflict,
+    PatternConflictError,
+    PayeeClassifier,
+    PayeePattern,
+)
+from .cache import ExtractCache, dump_transactions, file_digest, load_transactions
+from .fingerprints import (
+    FingerprintIndex,
+    RowKey,
+    fingerprint,
+    fingerprints_from_entries,
+)
+from .history import PayeeHistory
+from .records import AmountConverter, RowRecord, scale_amount
+from .stats import ImportStats
+from .summary import PERIODS, ImportSummary
+
+if TYPE_CHECKING:
+    from concurrent.futures import Executor
+
+    from .aio import Source
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
 HeaderField = namedtuple("HeaderField", ["label", "optional"])
 
 HEADER_FIELDS = {
@@ -89,246 +142,1597 @@ def _is_language_supported(language: str) -> bool:
     return language in HEADER_FIELDS
 
 
-def _header_values_for(language: str, include_optional: bool = True) -> List[List[str]]:
-    result = []
-    translations = HEADER_FIELDS[language]
+HeaderLayout = namedtuple(
+    "HeaderLayout", ["language", "labels", "columns", "decode_row"]
+)
 
-    for translation in translations:
-        if include_optional:
-            entries = OrderedDict(
-                (key, value.label) for (key, value) in translation.items()
-            )
-        else:
-            entries = OrderedDict(
-                (key, value.label)
-                for (key, value) in translation.items()
-                if not value.optional
-            )
-        result.append(list(entries.values()))
+# The fields `extract` needs from every row, in the order `decode_row` returns them
+_ROW_FIELDS = (
+    "date",
+    "payee",
+    "payment_reference",
+    "amount_eur",
+    "amount_foreign_currency",
+    "type_foreign_currency",
+    "exchange_rate",
+)
+
+
+def _build_header_index() -> Dict[Tuple[str, ...], HeaderLayout]:
+    """
+    Map every header N26 exports can start with (with and without the optional
+    fields) to its language, the translated labels, the column of every field, and
+    a function picking the `_ROW_FIELDS` out of a row
+    """
+
+    index = {}
+
+    for language, translations in HEADER_FIELDS.items():
+        for translation in translations:
+            labels = {key: field.label for (key, field) in translation.items()}
+
+            for include_optional in (True, False):
+                signature = tuple(
+                    field.label
+                    for field in translation.values()
+                    if include_optional or not field.optional
+                )
+                columns = {
+                    key: signature.index(field.label)
+                    for (key, field) in translation.items()
+                    if field.label in signature
+                }
+
+                decode_row = operator.itemgetter(
+                    *(columns[field] for field in _ROW_FIELDS)
+                )
+
+                index.setdefault(
+                    signature, HeaderLayout(language, labels, columns, decode_row)
+                )
+
+    return index
+
+
+_HEADER_INDEX = _build_header_index()
+
+
+def _detect_layout(header: List[str]) -> Optional[HeaderLayout]:
+    return _HEADER_INDEX.get(tuple(header))
+
+
+# Number of bytes read from the start of a file to find its header, more than enough
+# for every header in `HEADER_FIELDS`
+_HEADER_PREFIX_SIZE = 4096
+
+# The headers of `_HEADER_INDEX` encoded in a given encoding, along with the bytes
+# they can start with (quoted or not)
+_HeaderSignatures = namedtuple("_HeaderSignatures", ["headers", "first_bytes"])
 
-    return result
+_HEADER_SIGNATURES: Dict[str, Optional[_HeaderSignatures]] = {}
+
+
+def _header_signatures(encoding: str) -> Optional[_HeaderSignatures]:
+    """
+    The `_HeaderSignatures` of the given encoding, or `None` if files in that
+    encoding can't be matched byte by byte
+    """
+
+    if encoding in _HEADER_SIGNATURES:
+        return _HEADER_SIGNATURES[encoding]
+
+    from .reader import supports_encoding
+
+    signatures = None
+
+    if supports_encoding(encoding):
+        headers = {}
+
+        for header in _HEADER_INDEX:
+            try:
+                headers[",".join(header).encode(encoding)] = header
+            except UnicodeError:
+                # e.g. the German labels in ASCII
+                continue
+
+        first_bytes = {b'"'} | {encoded[:1] for encoded in headers}
+        signatures = _HeaderSignatures(headers, frozenset(first_bytes))
+
+    _HEADER_SIGNATURES[encoding] = signatures
+
+    return signatures
+
+
+def _read_header(filepath: str, encoding: str) -> List[str]:
+    """
+    Read the header of a file, matching the first bytes of the file against the
+    encoded headers of every layout, so that files which aren't N26 exports (PDFs,
+    archives, exports of other banks, ...) are rejected without decoding anything.
+
+    Returns an empty header for files which aren't N26 exports.
+    """
+
+    signatures = _header_signatures(encoding)
+
+    if signatures is None:
+        with open(filepath, encoding=encoding) as fd:
+            line = fd.readline(_HEADER_PREFIX_SIZE).lstrip("\ufeff").strip()
+
+        return [column.strip('"') for column in line.split(",")]
+
+    # skips the buffering (and the checks) of `open`, which cost more than reading
+    # a few bytes
+    fd = os.open(filepath, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+    try:
+        prefix = os.read(fd, _HEADER_PREFIX_SIZE)
+    finally:
+        os.close(fd)
+
+    # the byte order mark some tools (e.g. spreadsheets) write at the start of
+    # UTF-8 files
+    if prefix.startswith(codecs.BOM_UTF8):
+        prefix = prefix[len(codecs.BOM_UTF8) :]
+
+    # rejects most other files (e.g. "%PDF", "PK" for zip archives) right away
+    if prefix[:1] not in signatures.first_bytes:
+        return []
+
+    line, _, _ = prefix.partition(b"\n")
+    signature = b",".join(column.strip(b'"') for column in line.strip().split(b","))
+
+    return list(signatures.headers.get(signature, ()))
+
+
+def _is_iso_date(value: str) -> bool:
+    return len(value) == 10 and value[4] == "-" and value[7] == "-"
+
+
+def _parse_date(value: str) -> datetime.date:
+    if _is_iso_date(value):
+        return date.fromisoformat(value)
+
+    return datetime.strptime(value, "%Y-%m-%d").date()
 
 
 class InvalidFormatError(Exception):
     pass
 
 
-PayeePattern = namedtuple("PayeePattern", ["regex", "account"])
+class _SourceLines:
+    """
+    Iterator over the lines of a file which remembers the lines handed out since the
+    last call to `pop`, so that the raw source of every CSV record (which might span
+    multiple lines) is available without keeping the whole file in memory
+    """
+
+    def __init__(self, fd):
+        self._fd = fd
+        self._lines = []
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> str:
+        line = next(self._fd)
+        self._lines.append(line)
+        return line
+
+    def pop(self) -> str:
+        source = "".join(self._lines).strip()
+        self._lines.clear()
+        return source
+
+
+CacheInfo = namedtuple("CacheInfo", ["hits", "misses", "maxsize", "currsize"])
+
+
+class _LRUCache:
+    """
+    Mapping holding at most `maxsize` items, evicting the least recently used one.
+
+    Safe to use from multiple threads (e.g. by the executor of `aextract`).
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                self._items.move_to_end(key)
+            except KeyError:
+                self.misses += 1
+                return default
+
+            self.hits += 1
+            return self._items[key]
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def info(self) -> CacheInfo:
+        return CacheInfo(self.hits, self.misses, self.maxsize, len(self._items))
+
+
+# Marks payees missing from the classification cache (as `None` is a valid result)
+_UNCLASSIFIED = object()
+
+# number of records whose amounts are converted at once by `iter_extract`
+_BATCH_SIZE = 1024
+
+
+class _FileSession:
+    """
+    Everything read from a file that's shared between `identify`, `date` and
+    `extract`: the header and (for files of a reasonable size) the parsed rows
+    """
+
+    # Files larger than this are streamed on every call instead of being cached
+    MAX_CACHED_ROWS_SIZE = 4 * 1024 * 1024
+
+    def __init__(self, header: List[str], size: int):
+        self.header = header
+        self.layout = _detect_layout(header)
+        self.size = size
+        self.rows = None
+
+
+ExtractResult = namedtuple("ExtractResult", ["filepath", "entries", "error"])
+
+# The importer used by the processes of `N26Importer.extract_many`, set once when the
+# process is started
+_worker_importer = None
+
+
+def _init_worker(importer: "N26Importer"):
+    global _worker_importer
+    _worker_importer = importer
+
+
+def _extract_result(importer: "N26Importer", filepath: str) -> ExtractResult:
+    try:
+        return ExtractResult(filepath, importer.extract(filepath), None)
+    except Exception as error:
+        return ExtractResult(filepath, [], error)
+
+
+def _extract_in_worker(filepath: str) -> ExtractResult:
+    return _extract_result(_worker_importer, filepath)
+
+
+def _extract_shard_in_worker(shard: Tuple[str, Tuple[int, int]]) -> tuple:
+    return _worker_importer._extract_shard(*shard)
+
+
+def _build_classifier(
+    account_patterns: Dict[str, List[str]], account_priorities: Dict[str, int]
+) -> PayeeClassifier:
+    seen_patterns = set()
+    payee_patterns = []
+
+    for account, patterns in account_patterns.items():
+        for pattern in patterns:
+            assert pattern not in seen_patterns, f"{pattern} defined in multiple accounts"
+
+            seen_patterns.add(pattern)
+            payee_patterns.append(
+                PayeePattern(
+                    regex=LazyPattern(pattern, flags=re.IGNORECASE),
+                    account=account,
+                    priority=account_priorities.get(account, 0),
+                )
+            )
+
+    return PayeeClassifier(payee_patterns)
+
+
+def _package_version() -> str:
+    from importlib.metadata import PackageNotFoundError, version
+
+    try:
+        return version("beancount-n26")
+    except PackageNotFoundError:
+        return "unknown"
+
+
+def _pattern_cache_file(
+    directory: str,
+    account_patterns: Dict[str, List[str]],
+    account_priorities: Dict[str, int],
+) -> str:
+    import json
+
+    # the order of the patterns matters, as the first matching one wins
+    key = json.dumps(
+        [list(account_patterns.items()), sorted(account_priorities.items())]
+    )
+    digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).hexdigest()
+
+    return os.path.join(directory, f"patterns-{digest}.pickle")
 
 
 class N26Importer(Importer):
+    # Files smaller than this per worker are extracted by `extract_sharded` in a
+    # single process, as starting workers would take longer than extracting them
+    MIN_SHARD_SIZE = 1024 * 1024
+
     def __init__(
         self,
         iban: str,
         account_name: str,
-        language: str = "en",
+        language: Optional[str] = "en",
         file_encoding: str = "utf-8",
         account_patterns: Dict[str, List[str]] = {},
+        account_priorities: Dict[str, int] = {},
+        check_pattern_conflicts: bool = False,
+        session_cache_size: int = 8,
+        fingerprint_index: Optional[str] = None,
+        commit_fingerprints: bool = True,
+        payee_history: Optional[str] = None,
+        classification_cache_size: int = 4096,
+        collect_stats: bool = False,
+        use_mmap: bool = False,
+        pattern_cache: Optional[str] = None,
+        extract_cache: Optional[str] = None,
+        extract_cache_size: int = 64 * 1024 * 1024,
+        summary_period: Optional[str] = None,
+        opening_balance: Union[
+            Mapping[str, Decimal], Callable[[str], Optional[Decimal]], None
+        ] = None,
     ):
         self.iban = iban
         self.account_name = account_name
         self.language = language
         self.file_encoding = file_encoding
-        self.payee_patterns = set()
 
-        self._filepath = None
-        self._translation_strings = None
+        self._sessions = _LRUCache(session_cache_size)
+
+        # memory-mapping relies on separators being encoded as single bytes
+        self.use_mmap = use_mmap
+
+        if use_mmap:
+            from .reader import supports_encoding
 
-        if not _is_language_supported(language):
+            self.use_mmap = supports_encoding(file_encoding)
+
+        self.payee_history_path = payee_history
+        self._payee_history = None
+        self._classifications = _LRUCache(classification_cache_size)
+        self._amount_converter = AmountConverter()
+
+        self.collect_stats = collect_stats
+        self.stats: Dict[str, ImportStats] = {}
+
+        if summary_period is not None and summary_period not in PERIODS:
+            raise ValueError(
+                "Summary period {} is not one of {}".format(
+                    summary_period, ", ".join(PERIODS)
+                )
+            )
+
+        self.summary_period = summary_period
+        self.opening_balance = opening_balance
+        self.summaries: Dict[str, ImportSummary] = {}
+
+        self.fingerprint_index = None
+
+        if fingerprint_index is not None:
+            self.fingerprint_index = FingerprintIndex(
+                fingerprint_index, autocommit=commit_fingerprints
+            )
+
+        if language is not None and not _is_language_supported(language):
             raise InvalidFormatError(
                 "Language {} is not supported (yet)".format(language)
             )
 
         # Compile account and payee pattern regular expressions
 
-        seen_patterns = set()
+        self.pattern_cache = pattern_cache
+        self.payee_classifier = None
+
+        if pattern_cache is not None:
+            cache_file = _pattern_cache_file(
+                pattern_cache, account_patterns, account_priorities
+            )
+            self.payee_classifier = PayeeClassifier.load(cache_file)
+
+        if self.payee_classifier is None:
+            self.payee_classifier = _build_classifier(
+                account_patterns, account_priorities
+            )
+
+            if pattern_cache is not None:
+                self.payee_classifier.save(cache_file)
+
+        self.payee_patterns = self.payee_classifier.patterns
+
+        self.account_patterns = account_patterns
+        self.account_priorities = account_priorities
+
+        self.extract_cache = None
 
-        for account, patterns in account_patterns.items():
-            for pattern in patterns:
-                assert (
-                    pattern not in seen_patterns
-                ), f"{pattern} defined in multiple accounts"
+        if extract_cache is not None:
+            self.extract_cache = ExtractCache(extract_cache, extract_cache_size)
 
-                seen_patterns.add(pattern)
-                self.payee_patterns.add(
-                    PayeePattern(
-                        regex=re.compile(pattern, flags=re.IGNORECASE),
-                        account=account,
+        if check_pattern_conflicts:
+            conflicts = self.payee_classifier.conflicts()
+
+            if conflicts:
+                raise PatternConflictError(
+                    "Overlapping patterns: "
+                    + ", ".join(
+                        f"{c.pattern} ({c.account}) shadows "
+                        f"{c.shadowed_pattern} ({c.shadowed_account})"
+                        for c in conflicts
                     )
                 )
 
+    def __getstate__(self):
+        state = self.__dict__.copy()
+
+        # file sessions are only valid for the process that created them
+        state["_sessions"] = _LRUCache(self._sessions.maxsize)
+
+        return state
+
+    def _worker(self) -> "N26Importer":
+        """
+        A copy of the importer for worker processes, without the options (and
+        results) that are only used by the parent process: imported rows are
+        skipped (in the order of the files, as workers would all look them up
+        before any of them adds to the `fingerprint_index`) and summarized once the
+        workers are done, and an `opening_balance` function might not even be
+        picklable (e.g. a lambda)
+        """
+
+        worker = copy.copy(self)
+        worker.fingerprint_index = None
+        worker.summary_period = None
+        worker.opening_balance = None
+        worker.summaries = {}
+        worker.stats = {}
+
+        return worker
+
+    def _for_executor(self, executor: Optional["Executor"]) -> "N26Importer":
+        from concurrent.futures import ProcessPoolExecutor
+
+        return self._worker() if isinstance(executor, ProcessPoolExecutor) else self
+
+    @property
+    def payee_history(self) -> Optional[PayeeHistory]:
+        """
+        The `PayeeHistory` stored at `payee_history`, loaded on first use
+        """
+
+        if self._payee_history is None and self.payee_history_path is not None:
+            self._payee_history = PayeeHistory.load(self.payee_history_path)
+
+        return self._payee_history
+
+    def classify(self, payee: str) -> Optional[str]:
+        """
+        Return the account the given payee should be booked on (or `None`), looking
+        it up in the `payee_history` first, and matching `account_patterns` next.
+
+        Decisions are remembered for the most recent `classification_cache_size`
+        payees, across all files handled by this importer.
+        """
+
+        account = self._classifications.get(payee, _UNCLASSIFIED)
+
+        if account is not _UNCLASSIFIED:
+            return account
+
+        account = None
+
+        if self.payee_history_path is not None:
+            account = self.payee_history.classify(payee)
+
+        if account is None:
+            account = self.payee_classifier.classify(payee)
+
+        self._classifications[payee] = account
+
+        return account
+
+    def classification_cache_info(self) -> CacheInfo:
+        """
+        Hits and misses of the payee classification cache (see `classify`)
+        """
+
+        return self._classifications.info()
+
     def account(self, _) -> data.Account:
         return data.Account(self.account_name)
 
-    def _update_translations(self, filepath: str):
+    def _session(self, filepath: str) -> _FileSession:
+        stat = os.stat(filepath)
+        key = (os.path.abspath(filepath), stat.st_size, stat.st_mtime_ns)
+
+        session = self._sessions.get(key)
+
+        if session is None:
+            session = _FileSession(
+                _read_header(filepath, self.file_encoding), stat.st_size
+            )
+            self._sessions[key] = session
+
+        return session
+
+    def _iter_rows(
+        self, filepath: str, fields: Iterable[str] = _ROW_FIELDS
+    ) -> Iterator[Tuple[str, List[str]]]:
+        """
+        Yield `(source, row)` pairs for every record of the file, serving them from
+        the file session if the file has already been parsed completely before.
+
+        With `use_mmap`, the file is memory-mapped instead, only the given `fields`
+        (by default the ones used by `extract`) are decoded, and nothing is cached.
+        """
+
+        session = self._session(filepath)
+
+        if session.rows is not None:
+            yield from session.rows
+            return
+
+        if self.use_mmap:
+            columns = session.layout.columns
+            from .reader import iter_mapped_rows
+
+            yield from iter_mapped_rows(
+                filepath,
+                self.file_encoding,
+                len(session.header),
+                sorted({columns[field] for field in fields if field in columns}),
+            )
+            return
+
+        cache = session.size <= _FileSession.MAX_CACHED_ROWS_SIZE
+        field_count = len(session.header)
+        rows = []
+
         with open(filepath, encoding=self.file_encoding) as fd:
-            line = fd.readline().strip()
+            lines = _SourceLines(fd)
+            reader = csv.reader(
+                lines, delimiter=",", quoting=csv.QUOTE_MINIMAL, quotechar='"'
+            )
 
-        actual_header = [column.strip('"') for column in line.split(",")]
+            # consume the header so that it's not attributed to the first row
+            next(reader, None)
+            lines.pop()
 
-        translations = HEADER_FIELDS[self.language]
+            for line in reader:
+                source = lines.pop()
 
-        for translation in translations:
-            fields = translation.values()
-            header_with_optional = [field.label for field in fields]
-            header_without_optional = [
-                field.label for field in fields if not field.optional
-            ]
+                if not line:
+                    continue
 
-            if (
-                actual_header == header_with_optional
-                or actual_header == header_without_optional
-            ):
-                self._translation_strings = {
-                    key: value.label for (key, value) in translation.items()
-                }
-                return
+                # rows missing trailing fields are padded like `csv.DictReader` would,
+                # so that every column can be looked up by its index
+                if len(line) < field_count:
+                    line += [""] * (field_count - len(line))
 
-        raise InvalidFormatError(
-            "File {} does not contain any of the expected headers".format(filepath)
-        )
+                row = (source, line)
+
+                if cache:
+                    rows.append(row)
+
+                yield row
 
-    def _translate(self, key):
-        return self._translation_strings[key]
+        if cache:
+            session.rows = rows
+
+    def _layout(self, filepath: str) -> Optional[HeaderLayout]:
+        layout = self._session(filepath).layout
+
+        if layout is None or self.language not in (None, layout.language):
+            return None
 
-    def _parse_date(self, entry):
-        return datetime.strptime(entry[self._translate("date")], "%Y-%m-%d").date()
+        return layout
+
+    def _require_layout(self, filepath: str):
+        if self._layout(filepath) is None:
+            raise InvalidFormatError(
+                "File {} does not contain any of the expected headers".format(filepath)
+            )
 
     def date(self, filepath: str) -> Optional[datetime.date]:
         if not self.identify(filepath):
             return None
 
-        self._update_translations(filepath)
+        self._require_layout(filepath)
 
-        date = None
+        session = self._session(filepath)
+        column = session.layout.columns["date"]
 
-        with open(filepath, encoding=self.file_encoding) as fd:
-            reader = csv.DictReader(
-                fd, delimiter=",", quoting=csv.QUOTE_MINIMAL, quotechar='"'
-            )
+        if self.use_mmap or session.size <= _FileSession.MAX_CACHED_ROWS_SIZE:
+            # the rows are kept in the file session for `extract` to reuse them, or
+            # are cheap to scan when memory-mapped
+            values = (line[column] for (_, line) in self._iter_rows(filepath))
+        else:
+            # only look at the date column of files too large to be cached
+            values = self._iter_column(filepath, column)
 
-            for line in reader:
-                date_tmp = self._parse_date(line)
+        # ISO dates sort chronologically as plain strings, so only the latest one
+        # needs to be parsed
+        latest = None
 
-                if not date or date_tmp > date:
-                    date = date_tmp
+        for value in values:
+            if not _is_iso_date(value):
+                return max(
+                    _parse_date(line[column]) for (_, line) in self._iter_rows(filepath)
+                )
 
-        return date
+            if latest is None or value > latest:
+                latest = value
 
-    def identify(self, filepath: str) -> bool:
-        try:
-            with open(filepath, encoding=self.file_encoding) as fd:
-                line = fd.readline().strip()
+        return None if latest is None else _parse_date(latest)
 
-            expected_headers = _header_values_for(self.language) + _header_values_for(
-                self.language, include_optional=False
+    def _iter_column(self, filepath: str, index: int) -> Iterator[str]:
+        with open(filepath, encoding=self.file_encoding) as fd:
+            reader = csv.reader(
+                fd, delimiter=",", quoting=csv.QUOTE_MINIMAL, quotechar='"'
             )
-            actual_header = [column.strip('"') for column in line.split(",")]
+            next(reader, None)
 
-            for expected_header in expected_headers:
-                if expected_header != actual_header:
-                    continue
-                return True
+            for row in reader:
+                if row:
+                    yield row[index]
 
-            return False
+    def identify(self, filepath: str) -> bool:
+        try:
+            return self._layout(filepath) is not None
         except ValueError:
             return False
 
     def extract(self, filepath: str, existing: data.Entries = None) -> data.Entries:
+        return list(self.iter_extract(filepath, existing))
+
+    def extract_many(
+        self, filepaths: Iterable[str], workers: Optional[int] = None
+    ) -> List[ExtractResult]:
+        """
+        Extract the transactions of multiple files using a pool of `workers`
+        processes (defaulting to the number of CPUs).
+
+        Returns an `ExtractResult` for every file, in the order the files were
+        given. Errors raised while extracting a file are stored in its result
+        instead of aborting the remaining files.
+
+        Rows already imported before are skipped once all files have been
+        extracted, in the order the files were given (see `fingerprint_index`), so
+        that rows shared by overlapping files are only extracted from the first one.
+        """
+
+        filepaths = list(filepaths)
+
+        if workers == 1:
+            return [_extract_result(self, filepath) for filepath in filepaths]
+
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(self._worker(),),
+        ) as executor:
+            results = list(executor.map(_extract_in_worker, filepaths))
+
+        for index, result in enumerate(results):
+            if result.error is None:
+                results[index] = result._replace(
+                    entries=self._finish_extract(result.filepath, result.entries, None)
+                )
+
+        return results
+
+    def extract_sharded(
+        self,
+        filepath: str,
+        existing: data.Entries = None,
+        workers: Optional[int] = None,
+        shards: Optional[int] = None,
+    ) -> data.Entries:
+        """
+        Extract the transactions of a single (large) file using a pool of `workers`
+        processes (defaulting to the number of CPUs), returning the same
+        transactions as `extract`.
+
+        The records of the file are split into `shards` byte ranges (one per worker
+        by default), which are parsed and classified separately, and put back
+        together in the order of the file. Files which are smaller than
+        `MIN_SHARD_SIZE` per worker, or in an encoding which can't be split byte by
+        byte (see `use_mmap`), are extracted by `extract` instead.
+
+        Rows already imported before are skipped once all shards have been
+        extracted (see `fingerprint_index`), and `stats` are not collected.
+        """
+
+        from .reader import split_records, supports_encoding
+
+        if workers is None:
+            workers = os.cpu_count() or 1
+
+        if shards is None:
+            shards = workers
+
+            if os.path.getsize(filepath) < N26Importer.MIN_SHARD_SIZE * workers:
+                shards = 1
+
+        if shards == 1 or not supports_encoding(self.file_encoding):
+            return self.extract(filepath, existing)
+
+        if not self.identify(filepath):
+            return []
+
+        spans = split_records(filepath, shards)
+
+        if workers == 1:
+            results = [self._extract_shard(filepath, span) for span in spans]
+        else:
+            from concurrent.futures import ProcessPoolExecutor
+
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=_init_worker,
+                initargs=(self._worker(),),
+            ) as executor:
+                results = list(
+                    executor.map(
+                        _extract_shard_in_worker, [(filepath, span) for span in spans]
+                    )
+                )
+
         entries = []
 
+        for columns in results:
+            shard_entries = load_transactions(filepath, columns)
+
+            # every shard counts its rows from zero
+            offset = len(entries)
+
+            for entry in shard_entries:
+                entry.meta["lineno"] += offset
+
+            entries += shard_entries
+
+        return self._finish_extract(filepath, entries, existing)
+
+    def _extract_shard(self, filepath: str, span: Tuple[int, int]) -> tuple:
+        """
+        Extract the transactions of the records within a byte range of the file
+        (see `extract_sharded`), numbering them from zero, in the compact form of
+        `dump_transactions`, which is much cheaper to pass between processes
+        """
+
+        from .reader import iter_mapped_rows
+
+        self._require_layout(filepath)
+
+        session = self._session(filepath)
+        columns = session.layout.columns
+        rows = iter_mapped_rows(
+            filepath,
+            self.file_encoding,
+            len(session.header),
+            sorted({columns[field] for field in _ROW_FIELDS}),
+            span,
+        )
+
+        entries = self._iter_extract(
+            filepath,
+            None,
+            enumerate(rows),
+            session.layout.decode_row,
+            time.perf_counter(),
+            deduplicate=False,
+            collect=False,
+        )
+
+        return dump_transactions(list(entries))
+
+    async def aidentify(
+        self, source: "Source", executor: Optional["Executor"] = None
+    ) -> bool:
+        """
+        Like `identify`, but without blocking the event loop: `source` can be a
+        path or the contents of an export (e.g. an async iterable of the chunks of
+        an upload), and the file is read in the given `executor` (defaulting to
+        the default executor of the event loop)
+        """
+
+        from .aio import run_in_executor, spooled
+
+        async with spooled(source) as filepath:
+            return await run_in_executor(
+                executor, self._for_executor(executor).identify, filepath
+            )
+
+    async def adate(
+        self, source: "Source", executor: Optional["Executor"] = None
+    ) -> Optional[datetime.date]:
+        """
+        Like `date`, but without blocking the event loop (see `aidentify`)
+        """
+
+        from .aio import run_in_executor, spooled
+
+        async with spooled(source) as filepath:
+            return await run_in_executor(
+                executor, self._for_executor(executor).date, filepath
+            )
+
+    async def aextract(
+        self,
+        source: "Source",
+        existing: data.Entries = None,
+        executor: Optional["Executor"] = None,
+        chunk_size: int = 256,
+    ) -> data.Entries:
+        """
+        Like `extract`, but without blocking the event loop (see `aiter_extract`)
+        """
+
+        return [
+            transaction
+            async for transaction in self.aiter_extract(
+                source, existing, executor, chunk_size
+            )
+        ]
+
+    async def aiter_extract(
+        self,
+        source: "Source",
+        existing: data.Entries = None,
+        executor: Optional["Executor"] = None,
+        chunk_size: int = 256,
+    ) -> AsyncIterator[data.Transaction]:
+        """
+        Like `iter_extract`, but without blocking the event loop: `source` can be a
+        path or the contents of an export (e.g. an async iterable of the chunks of
+        an upload), and the file is parsed and its payees classified in the given
+        `executor` (defaulting to the default executor of the event loop).
+
+        Transactions are produced `chunk_size` at a time, and only once the
+        previous ones have been consumed, so that a large file doesn't hold up
+        other tasks (or fill up memory) while the consumer is busy. Stopping early
+        (or cancelling the consuming task) stops reading the file, without adding
+        anything to the `fingerprint_index`.
+
+        With a `ProcessPoolExecutor`, the whole file is extracted by a single
+        worker process instead (and `stats` are not collected), and imported rows
+        are skipped once it's done.
+        """
+
+        from concurrent.futures import ProcessPoolExecutor
+
+        from .aio import iter_chunks, run_in_executor, spooled
+
+        async with spooled(source) as filepath:
+            if isinstance(executor, ProcessPoolExecutor):
+                transactions = await run_in_executor(
+                    executor, self._worker().extract, filepath
+                )
+
+                for entry in self._finish_extract(filepath, transactions, existing):
+                    yield entry
+
+                return
+
+            chunks = iter_chunks(
+                self.iter_extract(filepath, existing), executor, chunk_size
+            )
+
+            try:
+                async for chunk in chunks:
+                    for transaction in chunk:
+                        yield transaction
+            finally:
+                await chunks.aclose()
+
+    def iter_records(self, filepath: str) -> Iterator[RowRecord]:
+        """
+        Yield a compact `RowRecord` for every row of the given file, which can be
+        turned into a transaction using `build_transaction`
+        """
+
         if not self.identify(filepath):
+            return iter(())
+
+        self._require_layout(filepath)
+
+        return self._iter_records(
+            enumerate(self._iter_rows(filepath)),
+            self._session(filepath).layout.decode_row,
+            _parse_date,
+            scale_amount,
+        )
+
+    def _iter_records(
+        self,
+        rows: Iterable[Tuple[int, Tuple[str, List[str]]]],
+        decode_row: Callable[[List[str]], tuple],
+        parse_date: Callable[[str], date],
+        scale: Callable[[str], Tuple[int, int]],
+    ) -> Iterator[RowRecord]:
+        intern = sys.intern
+
+        for index, (source, line) in rows:
+            (
+                booking_date,
+                payee,
+                payment_reference,
+                eur_amount,
+                foreign_amount,
+                foreign_currency,
+                exchange_rate,
+            ) = decode_row(line)
+
+            if foreign_amount and foreign_currency != "EUR":
+                currency = intern(foreign_currency)
+                exchange_rate = intern(exchange_rate)
+            else:
+                currency = exchange_rate = None
+
+            yield RowRecord(
+                index,
+                source,
+                parse_date(booking_date).toordinal(),
+                intern(payee),
+                payment_reference,
+                *scale(eur_amount),
+                currency,
+                exchange_rate,
+            )
+
+    def build_transaction(
+        self, filepath: str, record: RowRecord, classify: Optional[Callable] = None
+    ) -> data.Transaction:
+        """
+        Build the transaction of a record yielded by `iter_records`
+        """
+
+        (transaction,) = self.build_transactions(filepath, [record], classify)
+
+        return transaction
+
+    def build_transactions(
+        self,
+        filepath: str,
+        records: Sequence[RowRecord],
+        classify: Optional[Callable] = None,
+    ) -> List[data.Transaction]:
+        """
+        Build the transactions of a batch of records yielded by `iter_records`,
+        converting all their amounts and exchange rates at once
+        """
+
+        if classify is None:
+            classify = self.classify
+
+        return [
+            self._build_transaction(
+                filepath, record, amount, price, classify(record.payee)
+            )
+            for (record, amount, price) in zip(
+                records,
+                self._amount_converter.amounts(records),
+                self._amount_converter.prices(records),
+            )
+        ]
+
+    def _build_transaction(
+        self,
+        filepath: str,
+        record: RowRecord,
+        amount: Amount,
+        price: Optional[Amount],
+        account: Optional[str],
+    ) -> data.Transaction:
+        meta = data.new_metadata(filepath, record.index)
+        meta["__source__"] = record.source
+
+        # According to the documentation:
+        # https://beancount.github.io/docs/command_line_accounting_cookbook.html#currency-transfers-conversions
+        # For the following posting
+        #     Assets:US:BofA:Checking      10000.00 USD @ 0.90 CHF
+        # > The balance amount of the second posting is calculated as
+        # > 10,000.00 USD x 0.90 CHF/USD = 9,000 CHF ...
+        #
+        # The exchange rate from the N26 CSV output seems to be the EUR amount
+        # divided by the amount in the foreign currency. We output the main amount
+        # in EUR (as that's the main currency of the account), and attach the
+        # inverse exchange rate as the price (see `AmountConverter`).
+
+        postings = [
+            data.Posting(
+                self.account(filepath),
+                amount,
+                None,
+                price,
+                None,
+                None,
+            ),
+        ]
+
+        if account:
+            postings += [
+                data.Posting(
+                    account,
+                    None,
+                    None,
+                    None,
+                    None,
+                    None,
+                ),
+            ]
+
+        return data.Transaction(
+            meta,
+            record.date,
+            flags.FLAG_OKAY,
+            record.payee,
+            record.payment_reference,
+            data.EMPTY_SET,
+            data.EMPTY_SET,
+            postings,
+        )
+
+    def iter_extract(
+        self, filepath: str, existing: data.Entries = None
+    ) -> Iterator[data.Transaction]:
+        """
+        Yield the transactions of the given file one at a time, reading the file
+        incrementally instead of loading it into memory as a whole.
+
+        With a `fingerprint_index`, rows already imported before (or already part
+        of the `existing` entries) are skipped before their transactions are built,
+        and the fingerprints of the new rows are added to the index once the whole
+        file has been read.
+
+        With `collect_stats`, the time spent in every phase and a few counters are
+        stored in `stats` (and logged at the debug level) for every file.
+
+        With a `summary_period`, the running balance of the rows and their totals
+        per period are stored in `summaries` for every file. Given an
+        `opening_balance` for the file as well (the balance before its earliest
+        row, from a mapping or function of file paths), a balance assertion is
+        yielded for the start of every period after the first one (see
+        `ImportSummary.balances`), once all transactions have been yielded.
+        """
+
+        start = time.perf_counter()
+
+        if not self.identify(filepath):
+            return
+
+        self._require_layout(filepath)
+
+        if self.extract_cache is not None:
+            yield from self._extract_cached(filepath, existing, start)
+            return
+
+        yield from self._iter_extract(
+            filepath,
+            existing,
+            enumerate(self._iter_rows(filepath)),
+            self._session(filepath).layout.decode_row,
+            start,
+        )
+        yield from self._balances(filepath)
+
+    def _summarize(self, filepath: str, entries: List[data.Transaction]):
+        """
+        Store the `ImportSummary` of the given transactions (which haven't been
+        deduplicated yet), if `summary_period` is set
+        """
+
+        if self.summary_period is not None:
+            summary = ImportSummary(
+                filepath, self.summary_period, self._opening_balance(filepath)
+            )
+            summary.add_transactions(entries)
+            self.summaries[filepath] = summary
+
+    def _opening_balance(self, filepath: str) -> Optional[Decimal]:
+        """
+        The `opening_balance` of the given file, if any
+        """
+
+        if self.opening_balance is None:
+            return None
+
+        if callable(self.opening_balance):
+            return self.opening_balance(filepath)
+
+        return self.opening_balance.get(filepath)
+
+    def _balances(self, filepath: str) -> List[data.Balance]:
+        """
+        The balance assertions of the latest `ImportSummary` of the given file (see
+        `opening_balance`)
+        """
+
+        summary = self.summaries.get(filepath)
+
+        if summary is None:
             return []
 
-        self._update_translations(filepath)
+        return summary.balances(self.account(filepath))
 
-        s_amount_eur = self._translate("amount_eur")
-        s_amount_foreign_currency = self._translate("amount_foreign_currency")
-        s_payee = self._translate("payee")
-        s_payment_reference = self._translate("payment_reference")
-        s_type_foreign_currency = self._translate("type_foreign_currency")
-        s_exchange_rate = self._translate("exchange_rate")
+    def _extract_cache_key(self, filepath: str) -> str:
+        """
+        Key of the transactions of the given file in the `extract_cache`, which
+        changes along with the contents of the file, and everything else the
+        transactions depend on
+        """
 
-        with open(filepath, encoding=self.file_encoding) as fd:
-            lines = [line.strip() for line in fd.readlines()]
-            reader = csv.DictReader(
-                lines, delimiter=",", quoting=csv.QUOTE_MINIMAL, quotechar='"'
+        import json
+
+        history = None
+        if self.payee_history_path is not None:
+            history = [self.payee_history_path]
+
+            try:
+                stat = os.stat(self.payee_history_path)
+                history += [stat.st_size, stat.st_mtime_ns]
+            except OSError:
+                pass
+
+        configuration = json.dumps(
+            [
+                _package_version(),
+                self.iban,
+                self.account_name,
+                self.language,
+                self.file_encoding,
+                list(self.account_patterns.items()),
+                sorted(self.account_priorities.items()),
+                history,
+            ]
+        )
+
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update(file_digest(filepath).encode("ascii"))
+        digest.update(configuration.encode("utf-8"))
+
+        return digest.hexdigest()
+
+    def _extract_cached(
+        self, filepath: str, existing: Optional[data.Entries], start: float
+    ) -> List[data.Transaction]:
+        key = self._extract_cache_key(filepath)
+        entries = self.extract_cache.get(key, filepath)
+
+        if entries is None:
+            entries = list(
+                self._iter_extract(
+                    filepath,
+                    existing,
+                    enumerate(self._iter_rows(filepath)),
+                    self._session(filepath).layout.decode_row,
+                    start,
+                    deduplicate=False,
+                )
             )
+            self.extract_cache.put(key, entries)
+        else:
+            self._summarize(filepath, entries)
 
-            for index, line in enumerate(reader):
-                meta = data.new_metadata(filepath, index)
-                meta["__source__"] = lines[index]
-
-                postings = []
-
-                eur_amount = line[s_amount_eur]
-                foreign_amount = line[s_amount_foreign_currency]
-                foreign_currency = line[s_type_foreign_currency]
-
-                if foreign_amount and foreign_currency != "EUR":
-                    # According to the documentation:
-                    # https://beancount.github.io/docs/command_line_accounting_cookbook.html#currency-transfers-conversions
-                    # For the following posting
-                    #     Assets:US:BofA:Checking      10000.00 USD @ 0.90 CHF
-                    # > The balance amount of the second posting is calculated as
-                    # > 10,000.00 USD x 0.90 CHF/USD = 9,000 CHF ...
-                    #
-                    # The exchange rate from the N26 CSV output seems to be the EUR
-                    # amount divided by the amount in the foreign currency. We output
-                    # the main amount in EUR (as that's the main currency of the
-                    # account), and attach the inverse exchange rate as the price.
-
-                    exchange_rate = Decimal(line[s_exchange_rate])
-
-                    postings += [
-                        data.Posting(
-                            self.account(filepath),
-                            Amount(Decimal(eur_amount), "EUR"),
-                            None,
-                            Amount(1 / exchange_rate, foreign_currency),
-                            None,
-                            None,
-                        ),
-                    ]
-                else:
-                    postings += [
-                        data.Posting(
-                            self.account(filepath),
-                            Amount(Decimal(eur_amount), "EUR"),
-                            None,
-                            None,
-                            None,
-                            None,
-                        ),
-                    ]
-
-                match = None
-                for pattern in self.payee_patterns:
-                    if pattern.regex.match(line[s_payee]):
-                        match = pattern.account
-                if match:
-                    postings += [
-                        data.Posting(
-                            match,
-                            None,
-                            None,
-                            None,
-                            None,
-                            None,
-                        ),
-                    ]
-
-                entries.append(
-                    data.Transaction(
-                        meta,
-                        self._parse_date(line),
-                        flags.FLAG_OKAY,
-                        line[s_payee],
-                        line[s_payment_reference],
-                        data.EMPTY_SET,
-                        data.EMPTY_SET,
-                        postings,
-                    )
+            if self.collect_stats:
+                stats = self.stats[filepath] = ImportStats(filepath)
+                stats.timings["cache"] += time.perf_counter() - start
+                stats.counters.update(rows=len(entries), cached=1)
+
+        if self.fingerprint_index is not None:
+            entries = self._skip_imported(filepath, entries, existing)
+
+        return entries + self._balances(filepath)
+
+    def _finish_extract(
+        self,
+        filepath: str,
+        entries: List[data.Transaction],
+        existing: Optional[data.Entries],
+    ) -> data.Entries:
+        """
+        Summarize the transactions of a file extracted without skipping imported
+        rows, skip them, and add the balance assertions of the file
+        """
+
+        self._summarize(filepath, entries)
+
+        if self.fingerprint_index is not None:
+            entries = self._skip_imported(filepath, entries, existing)
+
+        return entries + self._balances(filepath)
+
+    def _skip_imported(
+        self,
+        filepath: str,
+        entries: List[data.Transaction],
+        existing: Optional[data.Entries],
+    ) -> List[data.Transaction]:
+        """
+        Drop the transactions that are part of the `fingerprint_index` or the
+        `existing` entries (marking them as skipped in the `ImportSummary` of the
+        file), and add the remaining ones to the index
+        """
+
+        imported = fingerprints_from_entries(self.iban, self.account_name, existing)
+        new_fingerprints = []
+
+        new_entries = self._new_rows(
+            (
+                (
+                    entry,
+                    (
+                        entry.date,
+                        entry.postings[0].units.number,
+                        entry.payee,
+                        entry.narration,
+                    ),
+                )
+                for entry in entries
+            ),
+            imported,
+            Counter(),
+            new_fingerprints,
+            self.summaries.get(filepath),
+        )
+
+        self.fingerprint_index.update(new_fingerprints)
+
+        return new_entries
+
+    def _new_rows(
+        self,
+        items: Iterable[Tuple[T, RowKey]],
+        imported: Set[bytes],
+        occurrences: Counter,
+        new_fingerprints: List[bytes],
+        summary: Optional[ImportSummary],
+    ) -> List[T]:
+        """
+        The items (records or transactions) of the given `(item, key)` pairs whose
+        rows are neither part of the `fingerprint_index` nor `imported`, adding
+        their fingerprints to `new_fingerprints` and marking the other ones as
+        skipped in the `summary`; `occurrences` counts the keys seen so far, across
+        batches of the same file
+        """
+
+        new_items = []
+
+        for item, key in items:
+            row_fingerprint = fingerprint(self.iban, key, occurrences[key])
+            occurrences[key] += 1
+
+            if row_fingerprint in imported or row_fingerprint in self.fingerprint_index:
+                if summary is not None:
+                    summary.skip(key[0].toordinal())
+                continue
+
+            new_items.append(item)
+            new_fingerprints.append(row_fingerprint)
+
+        return new_items
+
+    def _iter_extract(
+        self,
+        filepath: str,
+        existing: Optional[data.Entries],
+        rows: Iterable[Tuple[int, Tuple[str, List[str]]]],
+        decode_row: Callable[[List[str]], tuple],
+        start: float,
+        deduplicate: bool = True,
+        collect: bool = True,
+    ) -> Iterator[data.Transaction]:
+        """
+        Build the transactions of the given `(index, (source, row))` pairs (see
+        `iter_extract`), skipping the ones already imported unless `deduplicate` is
+        disabled, and collecting the `stats` and `summaries` of the file unless
+        `collect` is disabled (e.g. for parts of the file)
+        """
+
+        fingerprint_index = self.fingerprint_index if deduplicate else None
+
+        parse_date = _parse_date
+        scale = scale_amount
+        amounts = self._amount_converter.amounts
+        prices = self._amount_converter.prices
+        classify = self.classify
+
+        stats = summary = None
+
+        if collect and self.collect_stats:
+            stats = self.stats[filepath] = ImportStats(filepath)
+            stats.timings["header"] += time.perf_counter() - start
+
+            rows = stats.timed_iter("parse", rows)
+            parse_date = stats.timed("dates", _parse_date)
+            scale = stats.timed("amounts", scale_amount)
+            amounts = stats.timed("amounts", amounts)
+            prices = stats.timed("amounts", prices)
+            classify = stats.timed("classification", self.classify)
+
+            cache_hits = self._classifications.hits
+            cache_misses = self._classifications.misses
+
+        if collect and self.summary_period is not None:
+            summary = ImportSummary(
+                filepath, self.summary_period, self._opening_balance(filepath)
+            )
+            self.summaries[filepath] = summary
+
+        row_count = skipped = matched = 0
+
+        if fingerprint_index is not None:
+            imported = fingerprints_from_entries(
+                self.iban, self.account_name, existing
+            )
+            occurrences = Counter()
+            new_fingerprints = []
+
+        records = self._iter_records(rows, decode_row, parse_date, scale)
+
+        while True:
+            batch = list(islice(records, _BATCH_SIZE))
+
+            if not batch:
+                break
+
+            row_count += len(batch)
+            batch_amounts = amounts(batch)
+            batch_accounts = None
+
+            if summary is not None:
+                # before skipping imported rows, which still count towards the
+                # balance, classifying them once for the transactions as well
+                batch_accounts = [classify(record.payee) for record in batch]
+
+                for record, amount, account in zip(
+                    batch, batch_amounts, batch_accounts
+                ):
+                    summary.add(record.date_ordinal, amount.number, account)
+
+            if fingerprint_index is not None:
+                kept = self._new_rows(
+                    (
+                        (
+                            position,
+                            (
+                                record.date,
+                                amount.number,
+                                record.payee,
+                                record.payment_reference,
+                            ),
+                        )
+                        for position, (record, amount) in enumerate(
+                            zip(batch, batch_amounts)
+                        )
+                    ),
+                    imported,
+                    occurrences,
+                    new_fingerprints,
+                    summary,
+                )
+                skipped += len(batch) - len(kept)
+
+                batch = [batch[position] for position in kept]
+                batch_amounts = [batch_amounts[position] for position in kept]
+
+                if batch_accounts is not None:
+                    batch_accounts = [batch_accounts[position] for position in kept]
+
+            if batch_accounts is None:
+                batch_accounts = [classify(record.payee) for record in batch]
+
+            for record, amount, price, account in zip(
+                batch, batch_amounts, prices(batch), batch_accounts
+            ):
+                transaction = self._build_transaction(
+                    filepath, record, amount, price, account
                 )
 
+                if len(transaction.postings) > 1:
+                    matched += 1
+
+                yield transaction
+
+        if fingerprint_index is not None:
+            fingerprint_index.update(new_fingerprints)
+
+        if stats is not None:
+            stats.counters.update(
+                rows=row_count,
+                skipped=skipped,
+                matched=matched,
+                cache_hits=self._classifications.hits - cache_hits,
+                classifier_calls=self._classifications.misses - cache_misses,
+            )
+
+            logger.debug(
+                "Extracted %d transactions from %s",
+                row_count - skipped,
+                filepath,
+                extra={"n26_stats": stats.as_dict()},
+            )
+
+
+# The fields `N26Router` needs from every row, to route it and to extract it
+_ROUTED_FIELDS = _ROW_FIELDS + ("account_name",)
+
+
+class N26Router(Importer):
+    """
+    Importer for the exports of multiple N26 accounts, handing every row to the
+    `N26Importer` of its account.
+
+    Exports in the newer layout name the account (e.g. "Main Account", or the name
+    of a space) of every row, which is looked up in `accounts`. Rows of other
+    accounts, and all rows of exports in the older layouts, are handed to the
+    `default` importer (or skipped without one).
+
+    The header of every file is read once, no matter how many accounts there are,
+    and its language is detected (ignoring the `language` of the importers).
+    """
+
+    def __init__(
+        self,
+        accounts: Dict[str, N26Importer],
+        default: Optional[N26Importer] = None,
+        file_encoding: str = "utf-8",
+        session_cache_size: int = 8,
+        use_mmap: bool = False,
+    ):
+        self.accounts = accounts
+        self.default = default
+
+        # reads files on behalf of all importers
+        self._reader = N26Importer(
+            None,
+            None,
+            language=None,
+            file_encoding=file_encoding,
+            session_cache_size=session_cache_size,
+            use_mmap=use_mmap,
+        )
+
+    def _account_column(self, filepath: str) -> Optional[int]:
+        return self._reader._session(filepath).layout.columns.get("account_name")
+
+    def _first_importer(self, filepath: str) -> Optional[N26Importer]:
+        """
+        The `default` importer, or the importer of the first row of the file
+        handled by one
+        """
+
+        if self.default is not None:
+            return self.default
+
+        column = self._account_column(filepath)
+
+        if column is None:
+            return None
+
+        rows = self._reader._iter_rows(filepath, _ROUTED_FIELDS)
+
+        if self._reader._session(filepath).size <= _FileSession.MAX_CACHED_ROWS_SIZE:
+            # read all rows, so that they're cached for `date` and `extract`
+            rows = list(rows)
+
+        for _, row in rows:
+            importer = self.accounts.get(row[column])
+
+            if importer is not None:
+                return importer
+
+        return None
+
+    def identify(self, filepath: str) -> bool:
+        if not self._reader.identify(filepath):
+            return False
+
+        # files without any row of the `accounts` would have no account to be
+        # archived in
+        return self._first_importer(filepath) is not None
+
+    def account(self, filepath: str) -> Optional[data.Account]:
+        """
+        The account of the `default` importer, or of the first row of the file
+        handled by one of the `accounts` (or `None` for files which aren't
+        identified)
+        """
+
+        importer = self._first_importer(filepath)
+
+        return None if importer is None else importer.account(filepath)
+
+    def date(self, filepath: str) -> Optional[datetime.date]:
+        return self._reader.date(filepath)
+
+    def route(
+        self, filepath: str
+    ) -> Dict[N26Importer, List[Tuple[int, Tuple[str, List[str]]]]]:
+        """
+        Group the `(index, (source, row))` pairs of the rows of the given file by
+        the importer handling them
+        """
+
+        column = self._account_column(filepath)
+        routes = defaultdict(list)
+        unknown = Counter()
+
+        rows = self._reader._iter_rows(filepath, _ROUTED_FIELDS)
+
+        for index, (source, row) in enumerate(rows):
+            importer = self.default
+
+            if column is not None:
+                importer = self.accounts.get(row[column], self.default)
+
+            if importer is None:
+                unknown[row[column]] += 1
+            else:
+                routes[importer].append((index, (source, row)))
+
+        for account_name, count in unknown.items():
+            logger.warning(
+                "Skipping %d rows of unknown account %r in %s",
+                count,
+                account_name,
+                filepath,
+            )
+
+        return routes
+
+    def extract(self, filepath: str, existing: data.Entries = None) -> data.Entries:
+        if not self.identify(filepath):
+            return []
+
+        decode_row = self._reader._session(filepath).layout.decode_row
+        entries = []
+
+        routes = self.route(filepath)
+
+        for importer, rows in routes.items():
+            entries += importer._iter_extract(
+                filepath, existing, rows, decode_row, time.perf_counter()
+            )
+
+        # keep the order of the file
+        entries.sort(key=lambda entry: entry.meta["lineno"])
+
+        for importer in routes:
+            entries += importer._balances(filepath)
+
         return entries
@@ -0,0 +1,96 @@
+import asyncio
+import os
+import tempfile
+import threading
+from concurrent.futures import Executor
+from contextlib import asynccontextmanager
+from itertools import islice
+from typing import AsyncIterable, AsyncIterator, Iterator, List, Optional, TypeVar, Union
+
+T = TypeVar("T")
+
+# A path to an export, or its contents (e.g. the body of an upload)
+Source = Union[str, os.PathLike, AsyncIterable[bytes]]
+
+
+async def run_in_executor(executor: Optional[Executor], function, *args):
+    return await asyncio.get_running_loop().run_in_executor(executor, function, *args)
+
+
+@asynccontextmanager
+async def spooled(source: Source) -> AsyncIterator[str]:
+    """
+    Provide the path of the given source, writing its contents to a temporary file
+    (which is removed afterwards) unless it's a path already.
+
+    The next chunk of the source is only read once the previous one has been
+    written, so that a slow disk slows down reading the source instead of piling
+    up chunks in memory. Chunks are written in the default executor of the event
+    loop, since the executor of the caller might be a process pool, which can't be
+    handed the file.
+    """
+
+    if isinstance(source, (str, os.PathLike)):
+        yield os.fspath(source)
+        return
+
+    loop = asyncio.get_running_loop()
+    fd, path = tempfile.mkstemp(prefix="n26-", suffix=".csv")
+
+    try:
+        with os.fdopen(fd, "wb") as f:
+            async for chunk in source:
+                await loop.run_in_executor(None, f.write, chunk)
+
+        yield path
+    finally:
+        os.unlink(path)
+
+
+def _next_chunk(iterator: Iterator[T], size: int, lock: threading.Lock) -> List[T]:
+    with lock:
+        return list(islice(iterator, size))
+
+
+def _close(iterator: Iterator, lock: threading.Lock):
+    with lock:
+        iterator.close()
+
+
+async def iter_chunks(
+    iterator: Iterator[T], executor: Optional[Executor], chunk_size: int
+) -> AsyncIterator[List[T]]:
+    """
+    Advance a blocking iterator in the executor, `chunk_size` items at a time.
+
+    The next chunk is only produced once the previous one has been consumed. When
+    the consumer stops early (or is cancelled), the iterator is closed in the
+    executor once it's done producing its current chunk.
+    """
+
+    loop = asyncio.get_running_loop()
+    # held while the iterator is advanced, so that it's not closed meanwhile
+    lock = threading.Lock()
+    exhausted = False
+
+    try:
+        while True:
+            chunk = await loop.run_in_executor(
+                executor, _next_chunk, iterator, chunk_size, lock
+            )
+
+            # a short chunk means the iterator has run to completion
+            exhausted = len(chunk) < chunk_size
+
+            if chunk:
+                yield chunk
+
+            if exhausted:
+                return
+    finally:
+        if not exhausted and hasattr(iterator, "close"):
+            try:
+                loop.run_in_executor(executor, _close, iterator, lock)
+            except RuntimeError:
+                # the executor has been shut down, so nothing is running anymore
+                iterator.close()
@@ -0,0 +1,238 @@
+import gc
+import hashlib
+import os
+import pickle
+import tempfile
+import zlib
+from datetime import date
+from typing import Dict, List, Optional
+
+from beancount.core import data, flags
+from beancount.core.amount import Amount
+from beancount.core.number import Decimal
+
+# Identifies files written by `ExtractCache`, to be bumped whenever the format of the
+# rows (or the way transactions are built) changes
+_CACHE_HEADER = "beancount-n26 extract cache 1"
+
+_SUFFIX = ".n26cache"
+
+
+def file_digest(filepath: str) -> str:
+    """
+    Hash of the contents of a file
+    """
+
+    digest = hashlib.blake2b(digest_size=20)
+
+    with open(filepath, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+def dump_transactions(entries: List[data.Transaction]) -> tuple:
+    """
+    Turn transactions into columns of plain values (e.g. to be pickled), storing
+    every distinct amount, price and account once
+    """
+
+    linenos = []
+    sources = []
+    ordinals = []
+    payees = []
+    narrations = []
+    # indices into `values`
+    postings = []
+    values: Dict[tuple, int] = {}
+
+    for entry in entries:
+        posting = entry.postings[0]
+        price = posting.price
+
+        linenos.append(entry.meta["lineno"])
+        sources.append(str(entry.meta["__source__"]))
+        ordinals.append(entry.date.toordinal())
+        payees.append(entry.payee)
+        narrations.append(entry.narration)
+
+        key = (
+            posting.account,
+            str(posting.units.number),
+            None if price is None else str(price.number),
+            None if price is None else price.currency,
+            entry.postings[1].account if len(entry.postings) > 1 else None,
+        )
+        postings.append(values.setdefault(key, len(values)))
+
+    return (linenos, sources, ordinals, payees, narrations, postings, list(values))
+
+
+def load_transactions(filepath: str, columns: tuple) -> List[data.Transaction]:
+    """
+    Turn the result of `dump_transactions` back into transactions of the given file
+    """
+
+    # none of the objects created here can form reference cycles, so there's no
+    # point in the garbage collector going through all of them over and over
+    gc_enabled = gc.isenabled()
+    gc.disable()
+
+    try:
+        return _load_transactions(filepath, columns)
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+
+def _load_transactions(filepath: str, columns: tuple) -> List[data.Transaction]:
+    linenos, sources, ordinals, payees, narrations, postings, values = columns
+
+    amounts: Dict[str, Amount] = {}
+    prices: Dict[tuple, Amount] = {}
+    decoded = []
+
+    for account, number, price_number, price_currency, other_account in values:
+        units = amounts.get(number)
+        if units is None:
+            units = amounts[number] = Amount(Decimal(number), "EUR")
+
+        price = None
+        if price_number is not None:
+            price = prices.get((price_number, price_currency))
+            if price is None:
+                price = prices[price_number, price_currency] = Amount(
+                    Decimal(price_number), price_currency
+                )
+
+        decoded.append(
+            (
+                data.Posting(account, units, None, price, None, None),
+                None
+                if other_account is None
+                else data.Posting(other_account, None, None, None, None, None),
+            )
+        )
+
+    transactions = []
+    fromordinal = date.fromordinal
+
+    for lineno, source, ordinal, payee, narration, index in zip(
+        linenos, sources, ordinals, payees, narrations, postings
+    ):
+        posting, other_posting = decoded[index]
+
+        transactions.append(
+            data.Transaction(
+                {"filename": filepath, "lineno": lineno, "__source__": source},
+                fromordinal(ordinal),
+                flags.FLAG_OKAY,
+                payee,
+                narration,
+                data.EMPTY_SET,
+                data.EMPTY_SET,
+                [posting] if other_posting is None else [posting, other_posting],
+            )
+        )
+
+    return transactions
+
+
+class ExtractCache:
+    """
+    Transactions extracted from files, stored in a directory and looked up by a key
+    identifying the contents of the file as well as everything else the
+    transactions depend on (see `N26Importer`).
+
+    The least recently used entries are removed once the files in the directory
+    take up more than `max_size` bytes.
+    """
+
+    def __init__(self, directory: str, max_size: int = 64 * 1024 * 1024):
+        self.directory = directory
+        self.max_size = max_size
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + _SUFFIX)
+
+    def get(self, key: str, filepath: str) -> Optional[List[data.Transaction]]:
+        """
+        Return the transactions stored for `key` (or `None`), with `filepath` as the
+        file they have been extracted from
+        """
+
+        path = self._path(key)
+
+        try:
+            with open(path, "rb") as f:
+                header, columns = pickle.loads(zlib.decompress(f.read()))
+        except (OSError, zlib.error, pickle.UnpicklingError, EOFError, ValueError):
+            return None
+
+        if header != _CACHE_HEADER:
+            return None
+
+        try:
+            # marks the entry as recently used
+            os.utime(path)
+        except OSError:
+            pass
+
+        return load_transactions(filepath, columns)
+
+    def put(self, key: str, entries: List[data.Transaction]):
+        os.makedirs(self.directory, exist_ok=True)
+
+        payload = zlib.compress(
+            pickle.dumps(
+                (_CACHE_HEADER, dump_transactions(entries)),
+                protocol=pickle.HIGHEST_PROTOCOL,
+            ),
+            # most of the time goes into compressing, with little to gain above 1
+            1,
+        )
+
+        # written to a temporary file first, so that concurrent runs never read a
+        # partially written entry
+        fd, temporary_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(payload)
+
+            os.replace(temporary_path, self._path(key))
+        except BaseException:
+            os.unlink(temporary_path)
+            raise
+
+        self.evict()
+
+    def evict(self):
+        """
+        Remove the least recently used entries until all of them fit in `max_size`
+        """
+
+        entries = []
+
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(_SUFFIX):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+
+                entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+
+        size = sum(entry_size for (_, entry_size, _) in entries)
+
+        for _, entry_size, path in sorted(entries):
+            if size <= self.max_size:
+                break
+
+            try:
+                os.unlink(path)
+            except OSError:
+                continue
+
+            size -= entry_size
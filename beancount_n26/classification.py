@@ -0,0 +1,409 @@
+import os
+import pickle
+import re
+import tempfile
+from collections import namedtuple
+from typing import Iterable, List, Optional, Pattern, Tuple
+
+PayeePattern = namedtuple(
+    "PayeePattern", ["regex", "account", "priority"], defaults=[0]
+)
+
+PatternConflict = namedtuple(
+    "PatternConflict", ["pattern", "account", "shadowed_pattern", "shadowed_account"]
+)
+
+# Characters that give a pattern a meaning other than "starts with this text"
+_REGEX_METACHARACTERS = frozenset(".^$*+?{}[]\\|()")
+
+# Constructs preventing a regular expression from being part of an alternation:
+# inline global flags (e.g. "(?x)") are only valid at the very start, and group
+# names and numbers (e.g. in backreferences) would change
+_NOT_COMBINABLE = re.compile(r"\(\?[aiLmsux]+\)|\(\?P|\(\?\(|\\\d|\\g")
+
+# Trie key marking the end of a literal pattern
+_END = ""
+
+# Identifies files written by `PayeeClassifier.save`, to be bumped whenever the
+# classifier's attributes change
+_CACHE_HEADER = "beancount-n26 classifier 3"
+
+
+def _literal_text(pattern: str) -> Optional[str]:
+    """
+    Return the text matched by a pattern without any regular expression syntax
+    (escaped characters like "\\." included), or `None` for any other pattern
+    """
+
+    if "\\" not in pattern:
+        if any(char in _REGEX_METACHARACTERS for char in pattern):
+            return None
+        return pattern
+
+    text = []
+    escaped = False
+
+    for char in pattern:
+        if escaped:
+            # "\d", "\b", "\1", etc. are not escaped characters but special ones
+            if char.isascii() and char.isalnum():
+                return None
+            text.append(char)
+            escaped = False
+        elif char == "\\":
+            escaped = True
+        elif char in _REGEX_METACHARACTERS:
+            return None
+        else:
+            text.append(char)
+
+    return None if escaped else "".join(text)
+
+
+class PatternConflictError(Exception):
+    pass
+
+
+class LazyPattern:
+    """
+    A regular expression which is only compiled once it's used.
+
+    `PayeeClassifier` matches plain-text patterns without ever using their regular
+    expressions, so compiling thousands of them (e.g. from a generated patterns
+    file) up front would be wasted. Other patterns are compiled right away, so that
+    invalid ones are still reported when they're defined, unless they're `lazy`
+    (e.g. because they're only made of patterns which have been validated before).
+    """
+
+    __slots__ = ("pattern", "flags", "_compiled")
+
+    def __init__(self, pattern: str, flags: int = 0, lazy: bool = False):
+        self.pattern = pattern
+        self.flags = flags
+        self._compiled = None
+
+        if not lazy and _literal_text(pattern) is None:
+            self._compiled = re.compile(pattern, flags)
+
+    def compile(self) -> Pattern:
+        if self._compiled is None:
+            self._compiled = re.compile(self.pattern, self.flags)
+
+        return self._compiled
+
+    def match(self, string: str, *args):
+        return self.compile().match(string, *args)
+
+    def __getattr__(self, name: str):
+        return getattr(self.compile(), name)
+
+    def __reduce__(self):
+        # pickled as source only, compiled regular expressions would be recompiled
+        # when they're unpickled anyway
+        return (_unpickle_lazy_pattern, (self.pattern, self.flags))
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (LazyPattern, re.Pattern)):
+            return (self.pattern, self.flags) == (other.pattern, other.flags)
+
+        return NotImplemented
+
+    def __hash__(self) -> int:
+        return hash((self.pattern, self.flags))
+
+    def __repr__(self) -> str:
+        return f"LazyPattern({self.pattern!r}, {self.flags!r})"
+
+
+def _unpickle_lazy_pattern(pattern: str, flags: int) -> LazyPattern:
+    lazy = LazyPattern.__new__(LazyPattern)
+    lazy.pattern = pattern
+    lazy.flags = flags
+    lazy._compiled = None
+
+    return lazy
+
+
+class _Alternation:
+    """
+    Finds the first of a list of regular expressions matching a payee.
+
+    All expressions are joined into a single alternation, which is enough to tell
+    whether any of them matches. Only if one does, the alternations of the first and
+    second half of the expressions (and so on) tell which one it is.
+
+    Joining non-capturing groups (instead of capturing groups telling which
+    alternative matched) lets the regular expression engine skip alternatives
+    using their common prefixes.
+    """
+
+    def __init__(self, regexes: List[Tuple[int, Pattern]], lazy: bool = False):
+        self.order = None
+        self._halves = None
+
+        if len(regexes) == 1:
+            self.order, self.regex = regexes[0]
+        else:
+            self.regex = LazyPattern(
+                "|".join(f"(?:{regex.pattern})" for (_, regex) in regexes),
+                flags=re.IGNORECASE,
+                lazy=lazy,
+            )
+            self._regexes = regexes
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # children are cheap to rebuild, but their regular expressions aren't
+        state["_halves"] = None
+
+        return state
+
+    def _children(self) -> Tuple["_Alternation", "_Alternation"]:
+        # only compiled once a payee matches, as most of them never will
+        halves = self._halves
+
+        if halves is None:
+            middle = len(self._regexes) // 2
+            halves = (
+                _Alternation(self._regexes[:middle]),
+                _Alternation(self._regexes[middle:]),
+            )
+            # assigned at once, so that other threads never see only one of them
+            self._halves = halves
+
+        return halves
+
+    def match(self, payee: str) -> Optional[int]:
+        if not self.regex.match(payee):
+            return None
+
+        node = self
+
+        while node.order is None:
+            left, right = node._children()
+            node = left if left.regex.match(payee) else right
+
+        return node.order
+
+
+class PayeeClassifier:
+    """
+    Assigns accounts to payees based on a list of `PayeePattern`s.
+
+    The patterns are evaluated the same way as `re.match(pattern, payee,
+    re.IGNORECASE)` would, with the first matching pattern deciding the account.
+    Patterns are ordered by descending `priority`, and patterns with the same
+    priority keep the order they were given in.
+
+    Instead of trying every regular expression on every payee, the patterns are
+    compiled once into
+    - a dictionary of lowercased plain-text patterns which decide the account on
+      their own when they are equal to the payee
+    - a trie of the lowercased plain-text patterns, which is walked along the payee
+    - an alternation of the plain-text patterns, used instead of the trie for
+      payees with non-ASCII characters, as `re.IGNORECASE` matches some of them to
+      ASCII letters (e.g. "İ" and "ı" to "i", or "ſ" to "s") unlike `str.lower`
+    - an alternation of all remaining regular expressions (see `_Alternation`)
+    - a list of regular expressions which can't be part of an alternation (those
+      with backreferences, named groups, or inline flags), tried one after the other
+
+    Only plain-text patterns made of ASCII characters are treated as such, others
+    are matched like regular expressions.
+    """
+
+    def __init__(self, patterns: Iterable[PayeePattern]):
+        self.patterns: List[PayeePattern] = sorted(
+            patterns, key=lambda pattern: -pattern.priority
+        )
+
+        self._trie = {}
+        self._fallback = []
+
+        literals = []
+        alternatives = []
+
+        for order, pattern in enumerate(self.patterns):
+            text = pattern.regex.pattern
+            literal = _literal_text(text)
+
+            if literal is not None and literal.isascii():
+                literal = literal.lower()
+                literals.append((order, literal))
+
+                node = self._trie
+                for char in literal:
+                    node = node.setdefault(char, {})
+                node.setdefault(_END, order)
+            elif not _NOT_COMBINABLE.search(text):
+                alternatives.append((order, pattern.regex))
+            else:
+                self._fallback.append((order, pattern.regex))
+
+        # A literal match ranked before every regular expression is final
+        self._first_regex_order = min(
+            [order for (order, _) in alternatives + self._fallback],
+            default=len(self.patterns),
+        )
+
+        # Literals which are final when the payee is equal to them, i.e. which are
+        # ranked before every regular expression and every literal prefix of theirs
+        self._exact = {}
+
+        for order, literal in literals:
+            if order < self._first_regex_order and self._match_literal(literal) == order:
+                self._exact[literal] = order
+
+        self._literal_alternation = None
+
+        if literals:
+            # only compiled once a non-ASCII payee comes along
+            self._literal_alternation = _Alternation(
+                [(order, self.patterns[order].regex) for (order, _) in literals],
+                lazy=True,
+            )
+
+        self._alternation = None
+
+        if alternatives:
+            try:
+                self._alternation = _Alternation(alternatives)
+            except re.error:
+                self._fallback = sorted(self._fallback + alternatives)
+
+    def _match_literal(self, payee: str) -> Optional[int]:
+        node = self._trie
+        best = node.get(_END)
+
+        for char in payee.lower():
+            node = node.get(char)
+            if node is None:
+                break
+
+            order = node.get(_END)
+            if order is not None and (best is None or order < best):
+                best = order
+
+        return best
+
+    def match(self, payee: str) -> Optional[PayeePattern]:
+        """
+        Return the first `PayeePattern` matching the given payee (or `None`)
+        """
+
+        if payee.isascii():
+            best = self._exact.get(payee.lower())
+
+            if best is not None:
+                return self.patterns[best]
+
+            best = self._match_literal(payee)
+        elif self._literal_alternation is not None:
+            best = self._literal_alternation.match(payee)
+        else:
+            best = None
+
+        if best is not None and best < self._first_regex_order:
+            return self.patterns[best]
+
+        if self._alternation is not None:
+            order = self._alternation.match(payee)
+            if order is not None and (best is None or order < best):
+                best = order
+
+        for order, regex in self._fallback:
+            if best is not None and order > best:
+                break
+            if regex.match(payee):
+                best = order
+                break
+
+        return None if best is None else self.patterns[best]
+
+    def conflicts(self) -> List[PatternConflict]:
+        """
+        Find plain-text patterns of different accounts which shadow each other,
+        i.e. where every payee matching a pattern also matches a prefix of it which
+        is tried first, so that the pattern never decides the account.
+
+        Each `PatternConflict` lists the pattern that wins first, followed by the
+        pattern that it shadows. Overlaps which are resolved by giving the longer
+        pattern a higher priority aren't conflicts.
+        """
+
+        conflicts = []
+
+        for order, pattern in enumerate(self.patterns):
+            literal = _literal_text(pattern.regex.pattern)
+            if literal is None or not literal.isascii():
+                continue
+
+            # every literal along the path of this one is a prefix of it
+            node = self._trie
+            prefixes = [node.get(_END)]
+            for char in literal.lower():
+                node = node[char]
+                prefixes.append(node.get(_END))
+
+            for other in prefixes:
+                # only prefixes tried before this pattern shadow it
+                if other is None or other >= order:
+                    continue
+
+                other_pattern = self.patterns[other]
+                if other_pattern.account == pattern.account:
+                    continue
+
+                conflicts.append(
+                    PatternConflict(
+                        other_pattern.regex.pattern,
+                        other_pattern.account,
+                        pattern.regex.pattern,
+                        pattern.account,
+                    )
+                )
+
+        return conflicts
+
+    @classmethod
+    def load(cls, path: str) -> Optional["PayeeClassifier"]:
+        """
+        Load a classifier saved using `save`, without compiling any of its regular
+        expressions until they're needed (or return `None` if it can't be loaded)
+        """
+
+        try:
+            with open(path, "rb") as f:
+                header, classifier = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, ValueError, TypeError):
+            return None
+
+        if header != _CACHE_HEADER or not isinstance(classifier, cls):
+            return None
+
+        return classifier
+
+    def save(self, path: str):
+        directory = os.path.dirname(path) or "."
+        os.makedirs(directory, exist_ok=True)
+
+        # written to a temporary file first, so that concurrent runs never load a
+        # partially written file
+        fd, temporary_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump((_CACHE_HEADER, self), f, protocol=pickle.HIGHEST_PROTOCOL)
+
+            os.replace(temporary_path, path)
+        except BaseException:
+            os.unlink(temporary_path)
+            raise
+
+    def classify(self, payee: str) -> Optional[str]:
+        """
+        Return the account of the first pattern matching the given payee (or `None`)
+        """
+
+        match = self.match(payee)
+
+        return None if match is None else match.account
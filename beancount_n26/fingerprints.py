@@ -0,0 +1,173 @@
+import hashlib
+import threading
+from collections import Counter
+from datetime import date
+from decimal import Decimal
+from typing import TYPE_CHECKING, Iterable, Iterator, Optional, Set, Tuple
+
+from beancount.core import data
+
+if TYPE_CHECKING:
+    import sqlite3
+
+# Fields identifying a transaction: date, amount, payee, and payment reference
+RowKey = Tuple[date, Decimal, str, str]
+
+
+def fingerprint(iban: str, key: RowKey, occurrence: int) -> bytes:
+    """
+    Hash identifying the `occurrence`-th transaction (counting from zero) with the
+    given key on the account with the given IBAN.
+
+    Counting occurrences keeps identical transactions (e.g. two coffees bought on the
+    same day) apart instead of considering the second one a duplicate of the first.
+    """
+
+    booking_date, amount, payee, reference = key
+    text = "\x1f".join(
+        (
+            iban,
+            booking_date.isoformat(),
+            # "-5.0" and "-5.00" are the same amount
+            format(amount.normalize(), "f"),
+            payee or "",
+            reference or "",
+            str(occurrence),
+        )
+    )
+
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+
+def fingerprints(iban: str, keys: Iterable[RowKey]) -> Iterator[bytes]:
+    """
+    Fingerprint a sequence of transaction keys, numbering repeated keys
+    """
+
+    occurrences = Counter()
+
+    for key in keys:
+        yield fingerprint(iban, key, occurrences[key])
+        occurrences[key] += 1
+
+
+def fingerprints_from_entries(
+    iban: str, account: str, entries: Optional[data.Entries]
+) -> Set[bytes]:
+    """
+    Fingerprint the transactions in `entries` that post to `account`, e.g. the
+    existing entries of a ledger
+    """
+
+    keys = []
+
+    for entry in entries or []:
+        if not isinstance(entry, data.Transaction):
+            continue
+
+        for posting in entry.postings:
+            if posting.account == account and posting.units is not None:
+                keys.append(
+                    (entry.date, posting.units.number, entry.payee, entry.narration)
+                )
+                break
+
+    return set(fingerprints(iban, keys))
+
+
+class FingerprintIndex:
+    """
+    Persistent set of transaction fingerprints, stored in an SQLite database.
+
+    Without `autocommit`, added fingerprints are only kept in memory (while still
+    being part of the set) until they are written to the database by `commit`, or
+    dropped by `rollback`.
+    """
+
+    def __init__(self, path: str, autocommit: bool = True):
+        self.path = path
+        self.autocommit = autocommit
+        self._connection = None
+        self._pending: Set[bytes] = set()
+        # the connection is shared by all threads (e.g. the executor of `aextract`)
+        self._lock = threading.Lock()
+
+    def _connect(self) -> "sqlite3.Connection":
+        if self._connection is None:
+            # only imported once needed, to keep importing this package fast
+            import sqlite3
+
+            self._connection = sqlite3.connect(
+                self.path, timeout=30, check_same_thread=False
+            )
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS fingerprints "
+                "(fingerprint BLOB PRIMARY KEY) WITHOUT ROWID"
+            )
+
+        return self._connection
+
+    def __getstate__(self):
+        # connections can't be shared with other processes
+        return {"path": self.path, "autocommit": self.autocommit}
+
+    def __setstate__(self, state):
+        self.__init__(state["path"], state.get("autocommit", True))
+
+    def __contains__(self, fingerprint: bytes) -> bool:
+        with self._lock:
+            if fingerprint in self._pending:
+                return True
+
+            cursor = self._connect().execute(
+                "SELECT 1 FROM fingerprints WHERE fingerprint = ?", (fingerprint,)
+            )
+
+            return cursor.fetchone() is not None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return (
+                self._connect()
+                .execute("SELECT COUNT(*) FROM fingerprints")
+                .fetchone()[0]
+                + len(self._pending)
+            )
+
+    def update(self, fingerprints: Iterable[bytes]):
+        if not self.autocommit:
+            with self._lock:
+                self._pending.update(fingerprints)
+            return
+
+        with self._lock, self._connect() as connection:
+            connection.executemany(
+                "INSERT OR IGNORE INTO fingerprints VALUES (?)",
+                ((fingerprint,) for fingerprint in fingerprints),
+            )
+
+    def commit(self):
+        """
+        Write the fingerprints added since the last `commit` to the database
+        """
+
+        with self._lock, self._connect() as connection:
+            connection.executemany(
+                "INSERT OR IGNORE INTO fingerprints VALUES (?)",
+                ((fingerprint,) for fingerprint in self._pending),
+            )
+            self._pending.clear()
+
+    def rollback(self):
+        """
+        Drop the fingerprints added since the last `commit`
+        """
+
+        with self._lock:
+            self._pending.clear()
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
@@ -0,0 +1,122 @@
+import re
+from collections import defaultdict
+from datetime import date
+from typing import Dict, Optional, Tuple
+
+_HEADER = "# beancount-n26 payee history 1"
+
+_NOT_LETTERS = re.compile(r"[\W\d_]+")
+
+
+def normalize_payee(payee: str) -> str:
+    """
+    Reduce a payee to its lowercased words, so that e.g. "REWE Markt GmbH 1234" and
+    "Rewe Markt GmbH, 5678" are considered the same merchant
+    """
+
+    return " ".join(_NOT_LETTERS.sub(" ", payee.lower()).split())
+
+
+def _best_accounts(weights: Dict[str, Dict[str, float]]) -> Dict[str, str]:
+    return {
+        payee: max(accounts.items(), key=lambda item: (item[1], item[0]))[0]
+        for (payee, accounts) in weights.items()
+    }
+
+
+class PayeeHistory:
+    """
+    Accounts that payees were booked on in the past, weighted by how often (and how
+    recently) that happened.
+
+    Payees are looked up by their lowercased name first, and by their normalized
+    name (see `normalize_payee`) next.
+    """
+
+    def __init__(self, weights: Dict[str, Dict[str, float]]):
+        self.weights = weights
+
+        normalized = defaultdict(lambda: defaultdict(float))
+        for payee, accounts in weights.items():
+            for account, weight in accounts.items():
+                normalized[normalize_payee(payee)][account] += weight
+
+        self._exact = _best_accounts(weights)
+        self._normalized = _best_accounts(normalized)
+
+    @classmethod
+    def from_relation(
+        cls,
+        relation: Dict[Tuple[str, str], Tuple[int, date]],
+        half_life_days: float = 365,
+        max_payees: Optional[int] = None,
+        min_weight: float = 0.1,
+    ) -> "PayeeHistory":
+        """
+        Build the history from `(payee, account) -> (count, last date)` pairs.
+
+        The weight of every pair is its count, halved for every `half_life_days`
+        its last date lies before the most recent date of all pairs. Pairs weighing
+        less than `min_weight` are dropped, so that merchants that haven't been used
+        in years don't linger, and only the `max_payees` heaviest payees are kept.
+        """
+
+        if not relation:
+            return cls({})
+
+        latest = max(last_date for (_, last_date) in relation.values())
+
+        weights = defaultdict(dict)
+        for (payee, account), (count, last_date) in relation.items():
+            weight = count * 0.5 ** ((latest - last_date).days / half_life_days)
+            if weight >= min_weight:
+                weights[payee.lower()][account] = weight
+
+        if max_payees is not None:
+            heaviest = sorted(
+                weights, key=lambda payee: sum(weights[payee].values()), reverse=True
+            )
+            weights = {payee: weights[payee] for payee in heaviest[:max_payees]}
+
+        return cls(dict(weights))
+
+    @classmethod
+    def load(cls, path: str) -> "PayeeHistory":
+        import gzip
+
+        weights = defaultdict(dict)
+
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            if f.readline().rstrip("\n") != _HEADER:
+                raise ValueError(f"{path} is not a supported payee history file")
+
+            for line in f:
+                payee, account, weight = line.rstrip("\n").split("\t")
+                weights[payee][account] = float(weight)
+
+        return cls(dict(weights))
+
+    def save(self, path: str):
+        import gzip
+
+        with gzip.open(path, "wt", encoding="utf-8") as f:
+            f.write(_HEADER + "\n")
+
+            for payee, accounts in sorted(self.weights.items()):
+                for account, weight in sorted(accounts.items()):
+                    f.write(f"{payee}\t{account}\t{weight:.4g}\n")
+
+    def __len__(self) -> int:
+        return len(self.weights)
+
+    def classify(self, payee: str) -> Optional[str]:
+        """
+        Return the account the given payee was booked on most (or `None`)
+        """
+
+        account = self._exact.get(payee.lower())
+
+        if account is None:
+            account = self._normalized.get(normalize_payee(payee))
+
+        return account
@@ -0,0 +1,237 @@
+import csv
+import mmap
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+
+_BLOCK_SIZE = 16 * 1024 * 1024
+
+
+class LazySource:
+    """
+    The raw text of a CSV record, decoded from the memory-mapped file only when it's
+    actually needed (e.g. by converting it using `str`)
+    """
+
+    __slots__ = ("_buffer", "_start", "_end", "_encoding")
+
+    def __init__(self, buffer: mmap.mmap, start: int, end: int, encoding: str):
+        self._buffer = buffer
+        self._start = start
+        self._end = end
+        self._encoding = encoding
+
+    def __str__(self) -> str:
+        return _translate_newlines(
+            self._buffer[self._start : self._end].decode(self._encoding).strip()
+        )
+
+    def __repr__(self) -> str:
+        return repr(str(self))
+
+    def __reduce__(self):
+        # the memory-mapped file can't be passed to other processes, but its text can
+        return str, (str(self),)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, LazySource):
+            other = str(other)
+
+        return str(self) == other
+
+    def __hash__(self) -> int:
+        return hash(str(self))
+
+
+def _translate_newlines(text: str) -> str:
+    # like files opened in text mode do, which is how rows are read without mmap
+    if "\r" in text:
+        return text.replace("\r\n", "\n").replace("\r", "\n")
+
+    return text
+
+
+def supports_encoding(encoding: str) -> bool:
+    """
+    Whether records of files in the given encoding can be found byte by byte, i.e.
+    the characters separating them are encoded the same way as in ASCII
+    """
+
+    try:
+        return all(char.encode(encoding) == char.encode("ascii") for char in ',"\n')
+    except (LookupError, UnicodeError):
+        return False
+
+
+def iter_records(
+    buffer: mmap.mmap, start: int = 0, stop: Optional[int] = None
+) -> Iterator[Tuple[int, bytes]]:
+    """
+    Yield the offset and bytes of every record in the buffer (up to the offset
+    `stop`), treating newlines inside quoted fields as part of the record
+    """
+
+    size = len(buffer) if stop is None else stop
+    find = buffer.find
+
+    while start < size:
+        end = find(b"\n", start, size)
+        if end == -1:
+            end = size
+
+        record = buffer[start:end]
+
+        # an odd number of quotes means the newline is part of a quoted field
+        while record.count(b'"') % 2 and end < size:
+            end = find(b"\n", end + 1, size)
+            if end == -1:
+                end = size
+
+            record = buffer[start:end]
+
+        yield start, record
+
+        start = end + 1
+
+
+def _count_quotes(buffer: mmap.mmap, start: int, end: int) -> int:
+    count = 0
+
+    # counted in blocks, as slicing copies the bytes
+    for offset in range(start, end, _BLOCK_SIZE):
+        count += buffer[offset : min(offset + _BLOCK_SIZE, end)].count(b'"')
+
+    return count
+
+
+def split_records(filepath: str, count: int) -> List[Tuple[int, int]]:
+    """
+    Split the records of a CSV file (except the header) into up to `count` byte
+    ranges of about the same size, which start and end at record boundaries, i.e.
+    never inside a quoted field
+    """
+
+    with open(filepath, "rb") as fd:
+        try:
+            buffer = mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # empty files can't be mapped
+            return []
+
+    with buffer:
+        return _split_buffer(buffer, count)
+
+
+def _split_buffer(buffer: mmap.mmap, count: int) -> List[Tuple[int, int]]:
+    size = len(buffer)
+    find = buffer.find
+
+    header = next(iter_records(buffer), None)
+    start = 0 if header is None else min(len(header[1]) + 1, size)
+
+    spans = []
+    target_size = max(1, (size - start) // max(1, count))
+
+    while start < size:
+        end = start + target_size
+
+        if end >= size or len(spans) == count - 1:
+            spans.append((start, size))
+            break
+
+        # an odd number of quotes between the start of the range (a record
+        # boundary) and a newline means the newline is part of a quoted field
+        quotes = _count_quotes(buffer, start, end)
+
+        while True:
+            newline = find(b"\n", end)
+            if newline == -1:
+                newline = size
+
+            quotes += _count_quotes(buffer, end, newline)
+            end = newline + 1
+
+            if not quotes % 2 or end >= size:
+                break
+
+        end = min(end, size)
+        spans.append((start, end))
+        start = end
+
+    return spans
+
+
+def _decode_fields(
+    record: bytes, field_count: int, columns: Tuple[int, ...], encoding: str
+) -> List[str]:
+    quotes = record.count(b'"')
+
+    if not quotes:
+        fields = record.split(b",")
+    elif quotes == 2 * field_count and record[:1] == b'"' and record[-1:] == b'"':
+        # every field quoted (like older N26 exports), none of them containing
+        # quotes itself
+        fields = record[1:-1].split(b'","')
+    else:
+        fields = None
+
+    if fields is None or len(fields) != field_count:
+        row = next(csv.reader([record.decode(encoding)]))
+
+        # padded like rows missing trailing fields are by `N26Importer`
+        if len(row) < field_count:
+            row += [""] * (field_count - len(row))
+
+        return row
+
+    row = [""] * field_count
+    for column in columns:
+        row[column] = fields[column].decode(encoding)
+
+    return row
+
+
+def iter_mapped_rows(
+    filepath: str,
+    encoding: str,
+    field_count: int,
+    columns: Iterable[int],
+    span: Optional[Tuple[int, int]] = None,
+) -> Iterator[Tuple[LazySource, List[str]]]:
+    """
+    Yield `(source, row)` pairs for every record (except the header) of a CSV file,
+    which is memory-mapped instead of read into memory.
+
+    Only the given `columns` of every row are decoded, while the remaining ones are
+    left empty. With a `span` (see `split_records`), only the records within that
+    byte range are yielded.
+    """
+
+    columns = tuple(columns)
+
+    with open(filepath, "rb") as fd:
+        try:
+            buffer = mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # empty files can't be mapped
+            return
+
+    if span is None:
+        records = iter_records(buffer)
+        next(records, None)
+    else:
+        records = iter_records(buffer, *span)
+
+    for start, record in records:
+        stripped = record.strip()
+
+        if not stripped:
+            continue
+
+        # e.g. the line breaks of a quoted field of a file with CRLF line endings
+        if b"\r" in stripped:
+            stripped = stripped.replace(b"\r\n", b"\n").replace(b"\r", b"\n")
+
+        yield (
+            LazySource(buffer, start, start + len(record), encoding),
+            _decode_fields(stripped, field_count, columns, encoding),
+        )
@@ -0,0 +1,184 @@
+import operator
+from datetime import date
+from decimal import Decimal
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from beancount.core.amount import Amount
+
+
+def scale_amount(value: str) -> Tuple[Optional[int], int]:
+    """
+    Represent a decimal amount as `(units, exponent)` integers, such that the amount
+    equals `units * 10 ** -exponent` (e.g. "-12.30" becomes `(-1230, 2)`), keeping
+    the exponent that `Decimal(value)` would have.
+
+    Negative zeros, which integers can't tell apart from zeros, have `None` units
+    instead (e.g. "-0.00" becomes `(None, 2)`).
+    """
+
+    whole, _, fraction = value.partition(".")
+
+    if not fraction or fraction.isdigit():
+        try:
+            units = int(whole + fraction)
+        except ValueError:
+            pass
+        else:
+            if units or "-" not in whole:
+                return units, len(fraction)
+
+    # anything else (e.g. "1E+2") is left to `Decimal` to make sense of
+    number = Decimal(value)
+
+    if not number.is_finite():
+        raise ValueError(f"Invalid amount {value!r}")
+
+    sign, digits, exponent = number.as_tuple()
+    units = int("".join(map(str, digits)))
+
+    if sign and not units:
+        return None, -exponent
+
+    return (-units if sign else units), -exponent
+
+
+def unscale_amount(units: Optional[int], exponent: int) -> Decimal:
+    """
+    Turn the result of `scale_amount` back into the `Decimal` it represents
+    """
+
+    if units is None:
+        return Decimal((1, (0,), -exponent))
+
+    return Decimal(units).scaleb(-exponent)
+
+
+class RowRecord:
+    """
+    A row of an N26 export, holding only what's needed to build its transaction, in a
+    compact form: dates are stored as ordinals, amounts as scaled integers (see
+    `scale_amount`), and payees and currencies are interned.
+
+    Records are cheap enough to be kept around for large exports, so that they can
+    be filtered (e.g. dropping rows that have been imported before) before building
+    the transactions of the remaining ones.
+    """
+
+    __slots__ = (
+        "index",
+        "source",
+        "date_ordinal",
+        "payee",
+        "payment_reference",
+        "amount_units",
+        "amount_exponent",
+        "currency",
+        "exchange_rate",
+    )
+
+    def __init__(
+        self,
+        index: int,
+        source: str,
+        date_ordinal: int,
+        payee: str,
+        payment_reference: str,
+        amount_units: Optional[int],
+        amount_exponent: int,
+        currency: Optional[str] = None,
+        exchange_rate: Optional[str] = None,
+    ):
+        self.index = index
+        self.source = source
+        self.date_ordinal = date_ordinal
+        self.payee = payee
+        self.payment_reference = payment_reference
+        self.amount_units = amount_units
+        self.amount_exponent = amount_exponent
+        # only set for amounts in a foreign currency
+        self.currency = currency
+        self.exchange_rate = exchange_rate
+
+    @property
+    def date(self) -> date:
+        return date.fromordinal(self.date_ordinal)
+
+    @property
+    def amount(self) -> Decimal:
+        """
+        The amount in EUR
+        """
+
+        return unscale_amount(self.amount_units, self.amount_exponent)
+
+    def __repr__(self) -> str:
+        return (
+            f"<RowRecord {self.index}: {self.date} {self.payee!r} {self.amount} EUR"
+            + (f" ({self.currency} @ {self.exchange_rate})" if self.currency else "")
+            + ">"
+        )
+
+
+_AMOUNT_KEY = operator.attrgetter("amount_units", "amount_exponent")
+_PRICE_KEY = operator.attrgetter("exchange_rate", "currency")
+
+
+class AmountConverter:
+    """
+    Converts the amounts and exchange rates of batches of records into beancount
+    `Amount`s, equal to what converting them one by one using `Decimal` returns.
+
+    Every distinct amount and exchange rate is converted only once (up to `maxsize`
+    of them), since e.g. card payments on the same day share their exchange rate,
+    and recurring payments share their amount. The resulting `Amount`s are shared
+    between the postings using them.
+    """
+
+    def __init__(self, maxsize: int = 65536):
+        self.maxsize = maxsize
+        self._amounts: Dict[Tuple[Optional[int], int], Amount] = {}
+        self._prices: Dict[Tuple[Optional[str], Optional[str]], Optional[Amount]] = {}
+
+    def _convert(self, name: str, keys: List[tuple], convert: Callable) -> list:
+        cache = getattr(self, name)
+        missing = set(keys).difference(cache)
+
+        if missing:
+            if len(cache) + len(missing) > self.maxsize:
+                # replaced instead of cleared, as other threads might be using it
+                cache = {}
+                setattr(self, name, cache)
+                missing = set(keys)
+
+            for key in missing:
+                cache[key] = convert(*key)
+
+        return list(map(cache.__getitem__, keys))
+
+    def amounts(self, records: Sequence[RowRecord]) -> List[Amount]:
+        """
+        The EUR amounts of the given records
+        """
+
+        return self._convert("_amounts", list(map(_AMOUNT_KEY, records)), _eur_amount)
+
+    def prices(self, records: Sequence[RowRecord]) -> List[Optional[Amount]]:
+        """
+        The prices of the EUR amounts of the given records in their foreign
+        currency (`None` for records without foreign currency)
+        """
+
+        return self._convert("_prices", list(map(_PRICE_KEY, records)), _price)
+
+
+def _eur_amount(units: Optional[int], exponent: int) -> Amount:
+    return Amount(unscale_amount(units, exponent), "EUR")
+
+
+def _price(exchange_rate: Optional[str], currency: Optional[str]) -> Optional[Amount]:
+    if currency is None:
+        return None
+
+    # N26 exports the EUR amount divided by the foreign amount, so the price of the
+    # EUR amount is its inverse
+    return Amount(1 / Decimal(exchange_rate), currency)
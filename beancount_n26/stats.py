@@ -0,0 +1,70 @@
+import time
+from collections import Counter, defaultdict
+from typing import Callable, Dict, Iterable, Iterator, TypeVar
+
+T = TypeVar("T")
+
+
+class ImportStats:
+    """
+    Time spent in every phase of importing a file (in seconds), along with counters
+    of what happened while doing so
+    """
+
+    def __init__(self, filepath: str):
+        self.filepath = filepath
+        self.timings: Dict[str, float] = defaultdict(float)
+        self.counters: Dict[str, int] = Counter()
+
+    def timed(self, phase: str, function: Callable[..., T]) -> Callable[..., T]:
+        """
+        Wrap `function` so that the time spent in it is added to `phase`
+        """
+
+        timings = self.timings
+        perf_counter = time.perf_counter
+
+        def wrapper(*args):
+            start = perf_counter()
+            try:
+                return function(*args)
+            finally:
+                timings[phase] += perf_counter() - start
+
+        return wrapper
+
+    def timed_iter(self, phase: str, iterable: Iterable[T]) -> Iterator[T]:
+        """
+        Wrap `iterable` so that the time spent producing its items is added to
+        `phase`
+        """
+
+        timings = self.timings
+        perf_counter = time.perf_counter
+        iterator = iter(iterable)
+
+        while True:
+            start = perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                timings[phase] += perf_counter() - start
+
+            yield item
+
+    def as_dict(self) -> dict:
+        return {
+            "filepath": self.filepath,
+            "timings": dict(self.timings),
+            "counters": dict(self.counters),
+        }
+
+    def __repr__(self) -> str:
+        timings = ", ".join(
+            f"{phase}={seconds * 1000:.1f}ms" for (phase, seconds) in self.timings.items()
+        )
+        counters = ", ".join(f"{name}={count}" for (name, count) in self.counters.items())
+
+        return f"<ImportStats {self.filepath}: {timings}; {counters}>"
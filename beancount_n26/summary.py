@@ -0,0 +1,181 @@
+from collections import Counter, defaultdict, namedtuple
+from datetime import date, timedelta
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from beancount.core import data
+from beancount.core.amount import Amount
+from beancount.core.number import ZERO, Decimal
+
+PERIODS: Dict[str, Callable[[date], date]] = {
+    "day": lambda day: day,
+    "week": lambda day: day - timedelta(days=day.weekday()),
+    "month": lambda day: day.replace(day=1),
+    "quarter": lambda day: day.replace(month=(day.month - 1) // 3 * 3 + 1, day=1),
+    "year": lambda day: day.replace(month=1, day=1),
+}
+
+# The totals of a period: the balance before and after it (starting from zero without
+# an opening balance), the sum of its amounts, and the number of rows
+PeriodTotals = namedtuple(
+    "PeriodTotals", ["start", "opening", "closing", "total", "count"]
+)
+
+
+class ImportSummary:
+    """
+    Running EUR balance of the rows of a file, along with their totals per period
+    (e.g. per "month", see `PERIODS`) and per period and account they have been
+    classified to (`None` for rows without account).
+
+    All rows of the file are accounted for, including the ones that have been
+    skipped because they had been imported before (see `skip`).
+    """
+
+    def __init__(
+        self, filepath: str, period: str, opening_balance: Optional[Decimal] = None
+    ):
+        self.filepath = filepath
+        self.period = period
+        self.opening_balance = opening_balance
+        self.balance = ZERO if opening_balance is None else opening_balance
+        self.row_count = 0
+
+        self._period_start = PERIODS[period]
+        # ordinal of a date -> start of its period, as rows mostly share their dates
+        self._periods: Dict[int, date] = {}
+        self._totals: Dict[date, Decimal] = defaultdict(Decimal)
+        self._counts: Dict[date, int] = Counter()
+        self._skipped: Dict[date, int] = Counter()
+        self._accounts: Dict[Tuple[date, Optional[str]], Decimal] = defaultdict(
+            Decimal
+        )
+
+    def add(self, date_ordinal: int, amount: Decimal, account: Optional[str]):
+        """
+        Account for a row booked on the day with the given ordinal
+        """
+
+        period = self._periods.get(date_ordinal)
+        if period is None:
+            period = self._periods[date_ordinal] = self._period_start(
+                date.fromordinal(date_ordinal)
+            )
+
+        self.balance += amount
+        self.row_count += 1
+        self._totals[period] += amount
+        self._counts[period] += 1
+        self._accounts[period, account] += amount
+
+    def skip(self, date_ordinal: int):
+        """
+        Mark a row booked on the day with the given ordinal (which has been added
+        before) as imported before
+        """
+
+        self._skipped[self._periods[date_ordinal]] += 1
+
+    def add_transactions(self, entries: Iterable[data.Transaction]):
+        """
+        Account for the rows of the given transactions (as built by `N26Importer`)
+        """
+
+        for entry in entries:
+            postings = entry.postings
+
+            self.add(
+                entry.date.toordinal(),
+                postings[0].units.number,
+                postings[1].account if len(postings) > 1 else None,
+            )
+
+    @property
+    def periods(self) -> List[PeriodTotals]:
+        """
+        The totals of every period with at least one row, in chronological order
+        """
+
+        balance = ZERO if self.opening_balance is None else self.opening_balance
+        periods = []
+
+        for start in sorted(self._totals):
+            total = self._totals[start]
+            periods.append(
+                PeriodTotals(
+                    start, balance, balance + total, total, self._counts[start]
+                )
+            )
+            balance += total
+
+        return periods
+
+    @property
+    def accounts(self) -> Dict[Tuple[date, Optional[str]], Decimal]:
+        """
+        The sum of the amounts of every period and account
+        """
+
+        return dict(sorted(self._accounts.items(), key=_account_key))
+
+    def balances(self, account: str) -> List[data.Balance]:
+        """
+        Balance assertions for `account` at the start of every period after the
+        first one, which only rely on the rows of the file and the opening balance
+        (i.e. the balance before the earliest row of the file).
+
+        Assertions between two periods whose rows have all been skipped are left
+        out, as they have been returned along with these rows already.
+        """
+
+        if self.opening_balance is None:
+            return []
+
+        periods = self.periods
+
+        return [
+            data.Balance(
+                data.new_metadata(self.filepath, self.row_count),
+                totals.start,
+                account,
+                Amount(totals.opening, "EUR"),
+                None,
+                None,
+            )
+            for previous, totals in zip(periods, periods[1:])
+            if self._skipped[previous.start] < previous.count
+            or self._skipped[totals.start] < totals.count
+        ]
+
+    def as_dict(self) -> dict:
+        return {
+            "filepath": self.filepath,
+            "period": self.period,
+            "balance": str(self.balance),
+            "periods": [
+                {
+                    "start": totals.start.isoformat(),
+                    "opening": str(totals.opening),
+                    "closing": str(totals.closing),
+                    "total": str(totals.total),
+                    "count": totals.count,
+                }
+                for totals in self.periods
+            ],
+            "accounts": [
+                {"start": start.isoformat(), "account": account, "total": str(total)}
+                for ((start, account), total) in self.accounts.items()
+            ],
+        }
+
+    def __repr__(self) -> str:
+        return (
+            f"<ImportSummary {self.filepath}: {self.row_count} rows, "
+            f"{len(self._totals)} {self.period}s, balance {self.balance} EUR>"
+        )
+
+
+def _account_key(item: tuple) -> tuple:
+    (start, account), _ = item
+
+    # rows without account last
+    return start, account is None, account or ""
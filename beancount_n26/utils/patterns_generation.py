@@ -1,56 +1,247 @@
 import json
+import os
+import re
+from collections import defaultdict, namedtuple
+from datetime import date
+from typing import Dict, List, Optional, Tuple
 
 from beancount.core import data
 from beancount import loader
 
-from collections import defaultdict
+from beancount_n26.history import PayeeHistory
 
+PayeeStats = namedtuple("PayeeStats", ["count", "last_date"])
 
-def generate_payees_to_account(main_file: str, dump_file: str):
+# (payee, account) -> number of transactions, and the date of the latest one
+PayeeRelation = Dict[Tuple[Optional[str], str], PayeeStats]
+
+_CACHE_VERSION = 2
+
+_PATTERNS_FORMAT = "beancount-n26-patterns"
+_PATTERNS_VERSION = 1
+
+
+def _file_mtimes(filenames: List[str]) -> Dict[str, int]:
+    return {filename: os.stat(filename).st_mtime_ns for filename in filenames}
+
+
+def _read_cache(cache_file: str) -> Optional[PayeeRelation]:
+    try:
+        with open(cache_file) as f:
+            cache = json.load(f)
+
+        if cache.get("version") != _CACHE_VERSION:
+            return None
+
+        if _file_mtimes(list(cache["files"])) != cache["files"]:
+            return None
+    except (OSError, ValueError, KeyError):
+        return None
+
+    return {
+        (payee, account): PayeeStats(count, date.fromisoformat(last_date))
+        for (payee, account, count, last_date) in cache["relation"]
+    }
+
+
+def _write_cache(cache_file: str, filenames: List[str], relation: PayeeRelation):
+    cache = {
+        "version": _CACHE_VERSION,
+        "files": _file_mtimes(filenames),
+        "relation": [
+            [payee, account, stats.count, stats.last_date.isoformat()]
+            for ((payee, account), stats) in relation.items()
+        ],
+    }
+
+    with open(cache_file, "w") as f:
+        json.dump(cache, f)
+
+
+def load_payee_relation(
+    main_file: str, cache_file: Optional[str] = None
+) -> PayeeRelation:
+    """
+    main_file: str
+        The beancount file from which you want to read the transactions
+    cache_file: str
+        Optional file in which the result is cached, until any of the files
+        included by `main_file` is modified
+
+    Loads the ledger once and counts, for every (lowercased) payee and account, the
+    transactions of that payee whose second posting is on that account (along with
+    the date of the latest such transaction)
+    """
+
+    if cache_file:
+        relation = _read_cache(cache_file)
+        if relation is not None:
+            return relation
+
+    entries, errors, options = loader.load_file(main_file)
+
+    relation = {}
+
+    for item in entries:
+        if not isinstance(item, data.Transaction) or len(item.postings) < 2:
+            continue
+
+        key = (item.payee.lower() if item.payee else None, item.postings[1].account)
+        count, last_date = relation.get(key, (0, item.date))
+        relation[key] = PayeeStats(count + 1, max(last_date, item.date))
+
+    if cache_file:
+        _write_cache(cache_file, options["include"], relation)
+
+    return relation
+
+
+def _payees_to_account(relation: PayeeRelation) -> Dict[Optional[str], List[str]]:
+    payees_to_account = defaultdict(set)
+    for payee, account in relation:
+        payees_to_account[payee].add(account)
+
+    return {k: sorted(v) for (k, v) in payees_to_account.items()}
+
+
+def _account_to_payees(relation: PayeeRelation) -> Dict[str, List[str]]:
+    account_to_payees = defaultdict(set)
+    for payee, account in relation:
+        account_to_payees[account].add(payee)
+
+    return {k: sorted(filter(None, v)) for (k, v) in account_to_payees.items()}
+
+
+def _account_patterns(relation: PayeeRelation) -> Dict[str, List[str]]:
+    # a payee can only be classified into one account, so pick the account most of
+    # its transactions were booked on
+    best = {}
+    for (payee, account), stats in relation.items():
+        if payee and (payee not in best or (stats.count, account) > best[payee]):
+            best[payee] = (stats.count, account)
+
+    account_patterns = defaultdict(list)
+    for payee, (_, account) in sorted(best.items()):
+        account_patterns[account].append(re.escape(payee))
+
+    return dict(account_patterns)
+
+
+def generate_payees_to_account(
+    main_file: str, dump_file: str, cache_file: Optional[str] = None
+):
     """
     main_file: str
         The beancount file from which you want to dump the transactions
     dump_file: str
         The file in which you want to write the json object
+    cache_file: str
+        Optional file caching the transactions read from main_file (see
+        `load_payee_relation`)
 
     Generates a Dict[str, List[str]] containing for each "payee" in the
     transaction it's associated list of accounts
     """
-    entries, errors, options = loader.load_file(main_file)
-    transactions = list(filter(lambda x: isinstance(x, data.Transaction), entries))
-    payees_to_account = defaultdict(set)
-    for item in transactions:
-        payees_to_account[item.payee.lower() if item.payee else None].add(
-            item.postings[1].account
-        )
-
-    for k, v in payees_to_account.items():
-        payees_to_account[k] = sorted(list(v))
+    generate_mappings(main_file, payees_to_account_file=dump_file, cache_file=cache_file)
 
-    with open(dump_file, "w") as f:
-        json.dump(payees_to_account, f, indent=2)
 
-
-def generate_account_to_payees(main_file: str, dump_file: str):
+def generate_account_to_payees(
+    main_file: str, dump_file: str, cache_file: Optional[str] = None
+):
     """
     main_file: str
         The beancount file from which you want to dump the transactions
     dump_file: str
         The file in which you want to write the json object
+    cache_file: str
+        Optional file caching the transactions read from main_file (see
+        `load_payee_relation`)
 
     Generates a Dict[str, List[str]] containing for each account in the
     transaction it's associated list of payees
     """
-    entries, errors, options = loader.load_file(main_file)
-    transactions = list(filter(lambda x: isinstance(x, data.Transaction), entries))
-    account_to_payees = defaultdict(set)
-    for item in transactions:
-        account_to_payees[item.postings[1].account].add(
-            item.payee.lower() if item.payee else None
+    generate_mappings(main_file, account_to_payees_file=dump_file, cache_file=cache_file)
+
+
+def generate_mappings(
+    main_file: str,
+    payees_to_account_file: Optional[str] = None,
+    account_to_payees_file: Optional[str] = None,
+    patterns_file: Optional[str] = None,
+    history_file: Optional[str] = None,
+    cache_file: Optional[str] = None,
+    half_life_days: float = 365,
+    max_payees: Optional[int] = None,
+):
+    """
+    main_file: str
+        The beancount file from which you want to dump the transactions
+    payees_to_account_file: str
+        Optional file in which to write the payees to accounts mapping (see
+        `generate_payees_to_account`)
+    account_to_payees_file: str
+        Optional file in which to write the account to payees mapping (see
+        `generate_account_to_payees`)
+    patterns_file: str
+        Optional file in which to write `account_patterns` which can be passed to
+        `N26Importer` using `load_account_patterns`
+    history_file: str
+        Optional file in which to write a `PayeeHistory`, which can be passed to
+        `N26Importer` as `payee_history`
+    cache_file: str
+        Optional file caching the transactions read from main_file (see
+        `load_payee_relation`)
+    half_life_days: float, max_payees: int
+        Passed to `PayeeHistory.from_relation` when writing the history_file
+
+    Generates all the requested files, loading the ledger only once
+    """
+    relation = load_payee_relation(main_file, cache_file=cache_file)
+
+    if payees_to_account_file:
+        with open(payees_to_account_file, "w") as f:
+            json.dump(_payees_to_account(relation), f, indent=2)
+
+    if account_to_payees_file:
+        with open(account_to_payees_file, "w") as f:
+            json.dump(_account_to_payees(relation), f, indent=2)
+
+    if patterns_file:
+        with open(patterns_file, "w") as f:
+            json.dump(
+                {
+                    "format": _PATTERNS_FORMAT,
+                    "version": _PATTERNS_VERSION,
+                    "account_patterns": _account_patterns(relation),
+                },
+                f,
+                indent=2,
+            )
+
+    if history_file:
+        history = PayeeHistory.from_relation(
+            {key: stats for (key, stats) in relation.items() if key[0]},
+            half_life_days=half_life_days,
+            max_payees=max_payees,
         )
+        history.save(history_file)
+
+
+def load_account_patterns(patterns_file: str) -> Dict[str, List[str]]:
+    """
+    patterns_file: str
+        A file written by `generate_mappings`
+
+    Returns the `account_patterns` stored in the file, with every payee escaped so
+    that it's matched literally and assigned to a single account
+    """
+    with open(patterns_file) as f:
+        patterns = json.load(f)
 
-    for k, v in account_to_payees.items():
-        account_to_payees[k] = sorted(list(filter(None, v)))
+    if (
+        patterns.get("format") != _PATTERNS_FORMAT
+        or patterns.get("version") != _PATTERNS_VERSION
+    ):
+        raise ValueError(f"{patterns_file} is not a supported patterns file")
 
-    with open(dump_file, "w") as f:
-        json.dump(account_to_payees, f, indent=2)
+    return patterns["account_patterns"]
@@ -0,0 +1,181 @@
+"""
+Benchmark the hot paths of `N26Importer` on synthetic N26 exports.
+
+    python benchmarks/run.py --rows 50000 --patterns 3000 --save baseline.json
+    python benchmarks/run.py --rows 50000 --patterns 3000 --compare baseline.json
+
+With `--compare`, the script exits with a non-zero status if any phase got slower
+than the baseline by more than `--tolerance`.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict
+
+from synthetic import generate_export, generate_patterns, layout_name, layouts
+
+from beancount_n26 import N26Importer
+
+IBAN = "DE99999999999999999999"
+
+
+def _best_of(
+    repeat: int, function: Callable[..., object], setup: Callable[[], tuple] = tuple
+) -> float:
+    timings = []
+
+    for _ in range(repeat):
+        args = setup()
+        start = time.perf_counter()
+        function(*args)
+        timings.append(time.perf_counter() - start)
+
+    return min(timings)
+
+
+def _peak_rss_mib() -> float:
+    # the high-water mark of the whole process, see `_run_layout_in_process`
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def _run_layout(
+    filepath: str, language: str, account_patterns: dict, rows: int, repeat: int
+) -> dict:
+    def importer():
+        return N26Importer(
+            IBAN,
+            "Assets:N26",
+            language=language,
+            account_patterns=account_patterns,
+        )
+
+    def fresh():
+        # a new importer for every run, so nothing is served from its caches
+        return (importer(),)
+
+    classifier = importer().payee_classifier
+    payees = [entry.payee for entry in importer().extract(filepath)]
+
+    timings = {
+        "construct": _best_of(repeat, importer),
+        "identify": _best_of(repeat, lambda i: i.identify(filepath), fresh),
+        "date": _best_of(repeat, lambda i: i.date(filepath), fresh),
+        "extract": _best_of(repeat, lambda i: i.extract(filepath), fresh),
+        "classify": _best_of(
+            repeat, lambda: [classifier.classify(payee) for payee in payees]
+        ),
+    }
+
+    return {
+        "seconds": timings,
+        "rows_per_second": {
+            phase: rows / seconds
+            for (phase, seconds) in timings.items()
+            if phase in ("date", "extract", "classify")
+        },
+        "peak_rss_mib": _peak_rss_mib(),
+    }
+
+
+def _run_layout_in_process(*args) -> dict:
+    # every layout runs in a new process, so that its peak memory usage isn't the
+    # one of the layouts measured before it
+    context = multiprocessing.get_context("spawn")
+
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+        return executor.submit(_run_layout, *args).result()
+
+
+def run(rows: int, patterns: int, repeat: int, seed: int) -> Dict[str, dict]:
+    account_patterns = generate_patterns(patterns, seed=seed)
+    results = {}
+
+    with tempfile.TemporaryDirectory() as directory:
+        for language, translation, include_optional in layouts():
+            name = layout_name(language, translation, include_optional)
+            filepath = os.path.join(directory, f"{name}.csv")
+
+            generate_export(
+                filepath,
+                rows,
+                language=language,
+                translation=translation,
+                include_optional=include_optional,
+                seed=seed,
+            )
+
+            results[name] = _run_layout_in_process(
+                filepath, language, account_patterns, rows, repeat
+            )
+
+    return results
+
+
+def report(results: Dict[str, dict]):
+    phases = list(next(iter(results.values()))["seconds"])
+
+    print(f"{'layout':<16}" + "".join(f"{phase:>12}" for phase in phases) + "  rss")
+
+    for name, result in results.items():
+        print(
+            f"{name:<16}"
+            + "".join(f"{result['seconds'][phase] * 1000:>10.1f}ms" for phase in phases)
+            + f"  {result['peak_rss_mib']:.0f}MiB"
+        )
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], tolerance: float):
+    regressions = []
+
+    for name, result in results.items():
+        for phase, seconds in result["seconds"].items():
+            expected = baseline.get(name, {}).get("seconds", {}).get(phase)
+
+            if expected and seconds > expected * (1 + tolerance):
+                regressions.append(
+                    f"{name} {phase}: {seconds * 1000:.1f}ms "
+                    f"(baseline {expected * 1000:.1f}ms)"
+                )
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=20_000)
+    parser.add_argument("--patterns", type=int, default=3_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="compare against this JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    results = run(args.rows, args.patterns, args.repeat, args.seed)
+    report(results)
+
+    if args.save:
+        with open(args.save, "w") as fd:
+            json.dump(results, fd, indent=2)
+
+    if args.compare:
+        with open(args.compare) as fd:
+            regressions = compare(results, json.load(fd), args.tolerance)
+
+        if regressions:
+            print("\nRegressions:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
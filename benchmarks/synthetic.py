@@ -0,0 +1,152 @@
+"""
+Generator for synthetic (but realistic looking) N26 CSV exports
+"""
+
+import csv
+import random
+from datetime import date, timedelta
+from typing import Dict, List, Tuple
+
+from beancount_n26 import HEADER_FIELDS
+
+MERCHANTS = [
+    "REWE",
+    "ALDI SUED",
+    "LIDL",
+    "EDEKA",
+    "DM DROGERIE",
+    "ROSSMANN",
+    "DEUTSCHE BAHN",
+    "BVG",
+    "SPOTIFY",
+    "NETFLIX.COM",
+    "AMAZON EU",
+    "AMAZON MARKETPLACE",
+    "PAYPAL",
+    "LIEFERANDO",
+    "IKEA",
+    "SATURN",
+    "SHELL",
+    "VODAFONE",
+    "TELEKOM",
+    "STADTWERKE",
+]
+
+FOREIGN_CURRENCIES = [("USD", "0.9214"), ("CHF", "1.0487"), ("GBP", "1.1623")]
+
+
+def layouts() -> List[Tuple[str, int, bool]]:
+    """
+    Every known header layout as `(language, translation index, with optional)`
+    """
+
+    result = []
+
+    for language, translations in HEADER_FIELDS.items():
+        for index in range(len(translations)):
+            for include_optional in (True, False):
+                result.append((language, index, include_optional))
+
+    return result
+
+
+def layout_name(language: str, index: int, include_optional: bool) -> str:
+    return f"{language}-{index}{'' if include_optional else '-required'}"
+
+
+def _payee(rng: random.Random, index: int) -> str:
+    if rng.random() < 0.8:
+        return rng.choice(MERCHANTS) + rng.choice(["", " GMBH", f" {index % 97:04d}"])
+
+    return f"PERSON {rng.randrange(10_000):05d}"
+
+
+def generate_export(
+    filepath: str,
+    rows: int,
+    language: str = "en",
+    translation: int = 0,
+    include_optional: bool = True,
+    foreign_ratio: float = 0.1,
+    seed: int = 0,
+):
+    """
+    Write an N26 export with `rows` transactions (sorted by date, like N26 does) in
+    the given header layout, `foreign_ratio` of them in a foreign currency
+    """
+
+    rng = random.Random(seed)
+    fields = [
+        (key, field)
+        for (key, field) in HEADER_FIELDS[language][translation].items()
+        if include_optional or not field.optional
+    ]
+
+    # the older layouts quote every field, the newer one only when necessary
+    quoting = csv.QUOTE_ALL if translation == 0 else csv.QUOTE_MINIMAL
+
+    day = date(2015, 1, 1)
+
+    with open(filepath, "w", encoding="utf-8", newline="") as fd:
+        writer = csv.writer(fd, quoting=quoting, lineterminator="\n")
+        writer.writerow([field.label for (_, field) in fields])
+
+        for index in range(rows):
+            if rng.random() < 0.3:
+                day += timedelta(days=1)
+
+            cents = rng.randrange(1, 50_000)
+            amount = f"{'-' if rng.random() < 0.9 else ''}{cents // 100}.{cents % 100:02d}"
+
+            values = {
+                "date": day.isoformat(),
+                "value_date": day.isoformat(),
+                "payee": _payee(rng, index),
+                "account_number": f"DE{rng.randrange(10**20):020d}",
+                "transaction_type": "Presentment",
+                "payment_reference": f"Payment {index}",
+                "category": "Miscellaneous",
+                "account_name": "Main Account",
+                "amount_eur": amount,
+                "amount_foreign_currency": "",
+                "type_foreign_currency": "",
+                "exchange_rate": "",
+            }
+
+            if rng.random() < foreign_ratio:
+                currency, rate = rng.choice(FOREIGN_CURRENCIES)
+                values["amount_foreign_currency"] = f"{float(amount) / float(rate):.2f}"
+                values["type_foreign_currency"] = currency
+                values["exchange_rate"] = rate
+
+            writer.writerow([values[key] for (key, _) in fields])
+
+
+def generate_patterns(count: int, seed: int = 0) -> Dict[str, List[str]]:
+    """
+    Generate `account_patterns` with `count` patterns, most of them plain merchant
+    names (like `generate_account_to_payees` produces) and some regular expressions
+    """
+
+    rng = random.Random(seed)
+    patterns = {}
+    seen = set()
+
+    for merchant in MERCHANTS:
+        account = "Expenses:" + merchant.split()[0].title().replace(".", "")
+        patterns.setdefault(account, []).append(merchant)
+        seen.add(merchant)
+
+    while len(seen) < count:
+        account = f"Expenses:Generated:A{rng.randrange(200):03d}"
+
+        if rng.random() < 0.9:
+            pattern = f"MERCHANT {rng.randrange(10**6):06d}"
+        else:
+            pattern = rf"SHOP\s+{rng.randrange(10**4):04d}(-\d+)?"
+
+        if pattern not in seen:
+            seen.add(pattern)
+            patterns.setdefault(account, []).append(pattern)
+
+    return patterns
@@ -0,0 +1,271 @@
+import datetime
+import re
+
+import pytest
+
+from beancount_n26 import (
+    classification,
+    LazyPattern,
+    PatternConflict,
+    PayeeClassifier,
+    PayeeHistory,
+    PayeePattern,
+)
+
+
+def make_classifier(*patterns):
+    return PayeeClassifier(
+        PayeePattern(regex=re.compile(pattern, flags=re.IGNORECASE), account=account)
+        for (pattern, account) in patterns
+    )
+
+
+@pytest.mark.parametrize(
+    "payee,account",
+    [
+        ("REWE Markt GmbH", "Expenses:Supermarket"),
+        ("rewe", "Expenses:Supermarket"),
+        ("Aldi Sued", "Expenses:Supermarket"),
+        ("Netflix.com", "Expenses:Subscriptions"),
+        ("Spotify AB", "Expenses:Subscriptions"),
+        ("Deutsche Bahn", "Expenses:Travel"),
+        ("DB Vertrieb GmbH", "Expenses:Travel"),
+        ("The REWE Group", None),
+        ("", None),
+    ],
+)
+def test_classify(payee, account):
+    classifier = make_classifier(
+        ("REWE", "Expenses:Supermarket"),
+        ("ALDI", "Expenses:Supermarket"),
+        (r"netflix\.com", "Expenses:Subscriptions"),
+        ("spotify|deezer", "Expenses:Subscriptions"),
+        ("(deutsche bahn|db vertrieb)", "Expenses:Travel"),
+    )
+
+    assert classifier.classify(payee) == account
+
+
+def test_classify_matches_re_match():
+    patterns = [
+        ("amazon", "Expenses:Shopping"),
+        ("amazon prime", "Expenses:Subscriptions"),
+        (r"amazon\s+marketplace", "Expenses:Shopping:Marketplace"),
+        ("(?i)AMAZON.DE", "Expenses:Shopping:DE"),
+        (r"(a)mazon\1", "Expenses:Never"),
+        (".*coffee", "Expenses:Coffee"),
+        (r"shop\s+(\d+)(-\d+)?$", "Expenses:Shop"),
+        (r"rewe\ markt\ \(city\)", "Expenses:Food"),
+        (r"rewe\ markt", "Expenses:Supermarket"),
+        ("(?P<name>edeka) (?P=name)", "Expenses:Never"),
+        ("(lidl)", "Expenses:Supermarket"),
+    ]
+    payees = [
+        "Amazon Prime",
+        "SHOP 1234-5",
+        "Shop 1234-",
+        "REWE Markt (City)",
+        "Rewe Markt (City) 123",
+        "REWE MARKT",
+        "Edeka edeka",
+        "Lidl",
+        "AMAZON MARKETPLACE",
+        "amazon.de",
+        "The Coffee Shop",
+        "Amazonia",
+        "Zalando",
+    ]
+
+    classifier = make_classifier(*patterns)
+
+    for payee in payees:
+        expected = None
+        for pattern, account in patterns:
+            if re.match(pattern, payee, flags=re.IGNORECASE):
+                expected = account
+                break
+
+        assert classifier.classify(payee) == expected, payee
+
+
+def test_classify_first_pattern_wins():
+    classifier = make_classifier(
+        ("amazon prime", "Expenses:Subscriptions"),
+        ("amazon", "Expenses:Shopping"),
+    )
+
+    assert classifier.classify("AMAZON PRIME") == "Expenses:Subscriptions"
+    assert classifier.classify("AMAZON EU") == "Expenses:Shopping"
+
+
+def test_classify_priority():
+    classifier = PayeeClassifier(
+        [
+            PayeePattern(re.compile("amazon", re.IGNORECASE), "Expenses:Shopping"),
+            PayeePattern(
+                re.compile("amazon prime", re.IGNORECASE), "Expenses:Subscriptions", 1
+            ),
+        ]
+    )
+
+    assert classifier.classify("AMAZON PRIME") == "Expenses:Subscriptions"
+    assert classifier.classify("AMAZON EU") == "Expenses:Shopping"
+
+
+def test_conflicts():
+    classifier = make_classifier(
+        ("amazon", "Expenses:Shopping"),
+        ("amazon prime", "Expenses:Subscriptions"),
+        ("amazon marketplace", "Expenses:Shopping"),
+        ("REWE", "Expenses:Supermarket"),
+        ("rewe", "Expenses:Food"),
+        ("ALDI.*", "Expenses:Food"),
+    )
+
+    assert classifier.conflicts() == [
+        PatternConflict(
+            "amazon", "Expenses:Shopping", "amazon prime", "Expenses:Subscriptions"
+        ),
+        PatternConflict("REWE", "Expenses:Supermarket", "rewe", "Expenses:Food"),
+    ]
+
+
+def test_payee_history(tmp_path):
+    history = PayeeHistory.from_relation(
+        {
+            ("rewe markt 0815", "Expenses:Food"): (10, datetime.date(2020, 1, 1)),
+            ("rewe markt 4711", "Expenses:Drinks"): (2, datetime.date(2020, 1, 1)),
+            ("videothek", "Expenses:Movies"): (50, datetime.date(2010, 1, 1)),
+            ("netflix", "Expenses:Movies"): (12, datetime.date(2019, 12, 1)),
+        },
+        half_life_days=365,
+    )
+
+    history.save(str(tmp_path / "history.gz"))
+    history = PayeeHistory.load(str(tmp_path / "history.gz"))
+
+    assert len(history) == 3
+    assert history.classify("REWE MARKT 4711") == "Expenses:Drinks"
+    assert history.classify("Rewe Markt, 1234") == "Expenses:Food"
+    assert history.classify("Netflix") == "Expenses:Movies"
+    assert history.classify("Videothek") is None
+
+
+def test_classify_exact_match():
+    classifier = make_classifier(
+        ("rewe", "Expenses:Supermarket"),
+        (r"rewe\ markt", "Expenses:Food"),
+        ("netflix", "Expenses:Subscriptions"),
+        ("amazon.*prime", "Expenses:Subscriptions"),
+        ("amazon", "Expenses:Shopping"),
+    )
+
+    assert classifier.classify("REWE") == "Expenses:Supermarket"
+    assert classifier.classify("Rewe Markt") == "Expenses:Supermarket"
+    assert classifier.classify("amazon") == "Expenses:Shopping"
+    assert classifier.classify("amazon prime") == "Expenses:Subscriptions"
+
+
+def test_classify_non_ascii():
+    patterns = [
+        ("istanbul", "Expenses:Food"),
+        ("sushi", "Expenses:Food:Sushi"),
+        ("ſtore", "Expenses:Shopping"),
+        ("bäckerei", "Expenses:Bakery"),
+        ("kiosk", "Expenses:Kiosk"),
+    ]
+    payees = [
+        "İSTANBUL KEBAP",
+        "ıstanbul",
+        "ſUSHI",
+        "STORE 24",
+        "Bäckerei Müller",
+        "BÄCKEREI",
+        "KIOSK",
+        "\u212aIOSK",
+        "Straße",
+    ]
+
+    classifier = make_classifier(*patterns)
+
+    for payee in payees:
+        expected = None
+        for pattern, account in patterns:
+            if re.match(pattern, payee, flags=re.IGNORECASE):
+                expected = account
+                break
+
+        assert classifier.classify(payee) == expected, payee
+
+
+def test_classify_non_ascii_compiles_lazily(monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError("Nothing should be compiled for ASCII payees")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(re, "compile", fail)
+        classifier = PayeeClassifier(
+            PayeePattern(LazyPattern(pattern, flags=re.IGNORECASE), account)
+            for (pattern, account) in [
+                ("istanbul", "Expenses:Food"),
+                ("rewe", "Expenses:Supermarket"),
+            ]
+        )
+
+        assert classifier.classify("REWE Markt") == "Expenses:Supermarket"
+
+    assert classifier.classify("İSTANBUL KEBAP") == "Expenses:Food"
+
+
+def test_save_and_load(tmp_path, monkeypatch):
+    classifier = PayeeClassifier(
+        PayeePattern(regex=LazyPattern(pattern, flags=re.IGNORECASE), account=account)
+        for (pattern, account) in [
+            ("rewe", "Expenses:Supermarket"),
+            (r"netflix\.com", "Expenses:Subscriptions"),
+            (r"shop\s+\d+", "Expenses:Shop"),
+        ]
+    )
+    classifier.save(str(tmp_path / "classifier.pickle"))
+
+    def fail(*args, **kwargs):
+        raise AssertionError("Nothing should be compiled when loading")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(re, "compile", fail)
+        loaded = PayeeClassifier.load(str(tmp_path / "classifier.pickle"))
+
+        assert loaded.classify("REWE Markt") == "Expenses:Supermarket"
+        assert loaded.classify("Netflix.com") == "Expenses:Subscriptions"
+
+    assert loaded.classify("Shop 1234") == "Expenses:Shop"
+    assert loaded.patterns == classifier.patterns
+
+    (tmp_path / "invalid.pickle").write_bytes(b"invalid")
+    assert PayeeClassifier.load(str(tmp_path / "invalid.pickle")) is None
+    assert PayeeClassifier.load(str(tmp_path / "missing.pickle")) is None
+
+
+def test_classify_while_splitting_alternation(monkeypatch):
+    classifier = make_classifier(
+        *((rf"shop\s+{number}", f"Expenses:Shop{number}") for number in range(8))
+    )
+
+    alternation_init = classification._Alternation.__init__
+    calls = []
+    interleaved = []
+
+    def interleaving_init(self, regexes):
+        # another thread classifying while the second half of an alternation is
+        # built, after the first one
+        calls.append(regexes)
+
+        if len(calls) == 2:
+            interleaved.append(classifier.classify("Shop 5"))
+
+        alternation_init(self, regexes)
+
+    monkeypatch.setattr(classification._Alternation, "__init__", interleaving_init)
+
+    assert classifier.classify("Shop 5") == "Expenses:Shop5"
+    assert interleaved == ["Expenses:Shop5"]
@@ -1,11 +1,21 @@
+import asyncio
 import datetime
+import multiprocessing
+import os
+import pickle
+import subprocess
+import sys
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from textwrap import dedent
 
 import pytest
+from beancount.core import data
+from beancount.core.amount import Amount
+from beancount.core.number import Decimal
 from beancount.parser.booking import convert_lot_specs_to_lots
 from beancount.parser.cmptest import TestCase as BeancountTest
 
-from beancount_n26 import HEADER_FIELDS, N26Importer
+from beancount_n26 import HEADER_FIELDS, N26Importer, N26Router, PatternConflictError
 
 IBAN_NUMBER = "DE99 9999 9999 9999 9999 99".replace(" ", "")
 
@@ -73,6 +83,57 @@ def test_identify_french(importer, filename):
     assert importer.identify(filename)
 
 
+def test_identify_byte_order_mark(importer, tmp_path):
+    filepath = tmp_path / "input.csv"
+    filepath.write_text(
+        '"Date","Payee","Account number","Transaction type","Payment reference",'
+        '"Amount (EUR)","Amount (Foreign Currency)","Type Foreign Currency",'
+        '"Exchange Rate"\r\n'
+        '"2019-10-10","Muster GmbH","DE99999999999999999999","Outgoing Transfer",'
+        '"Muster payment","-12.34","","",""\r\n',
+        encoding="utf-8-sig",
+    )
+
+    assert importer.identify(str(filepath))
+    assert importer.date(str(filepath)) == datetime.date(2019, 10, 10)
+    assert len(importer.extract(str(filepath))) == 1
+
+
+@pytest.mark.parametrize(
+    "contents",
+    [
+        b"",
+        b"%PDF-1.7\n%\xe2\xe3\xcf\xd3\n" + bytes(range(256)) * 64,
+        b"PK\x03\x04" + b"\xff" * 100_000,
+        b'"Date";"Payee";"Amount"\n"2019-10-10";"Muster GmbH";"-12.34"\n',
+        b'"Date","Payee","Account number"\n',
+    ],
+)
+def test_identify_other_files(importer, tmp_path, contents):
+    filepath = tmp_path / "input.csv"
+    filepath.write_bytes(contents)
+
+    assert not importer.identify(str(filepath))
+
+
+def test_identify_utf16(tmp_path):
+    filepath = tmp_path / "input.csv"
+    filepath.write_text(
+        '"Datum","Empfänger","Kontonummer","Transaktionstyp","Verwendungszweck",'
+        '"Betrag (EUR)","Betrag (Fremdwährung)","Fremdwährung","Wechselkurs"\n'
+        '"2019-10-10","Muster GmbH","DE99999999999999999999","Outgoing Transfer",'
+        '"Muster payment","-12.34","","",""\n',
+        encoding="utf-16",
+    )
+
+    importer = N26Importer(
+        IBAN_NUMBER, "Assets:N26", language="de", file_encoding="utf-16"
+    )
+
+    assert importer.identify(str(filepath))
+    assert len(importer.extract(str(filepath))) == 1
+
+
 def test_extract_no_transactions(importer, filename):
     """
     "Date","Payee","Account number","Transaction type","Payment reference","Category","Amount (EUR)","Amount (Foreign Currency)","Type Foreign Currency","Exchange Rate"
@@ -101,6 +162,25 @@ def test_extract_single_transaction(importer, filename):
     )
 
 
+@pytest.mark.parametrize("use_mmap", [False, True])
+def test_extract_short_row(filename, use_mmap):
+    """\
+    "Date","Payee","Account number","Transaction type","Payment reference","Category","Amount (EUR)","Amount (Foreign Currency)","Type Foreign Currency","Exchange Rate"
+    "2019-10-10","Muster GmbH","DE99999999999999999999","Outgoing Transfer","Muster payment","Miscellaneous","-12.34"
+    """
+
+    importer = N26Importer(IBAN_NUMBER, "Assets:N26", use_mmap=use_mmap)
+    transactions = importer.extract(filename)
+
+    assert_equal_entries(
+        r"""
+      2019-10-10 * "Muster GmbH" "Muster payment"
+        Assets:N26  -12.34 EUR
+    """,
+        transactions,
+    )
+
+
 def test_extract_multiple_transactions(importer, filename):
     """\
     "Date","Payee","Account number","Transaction type","Payment reference","Category","Amount (EUR)","Amount (Foreign Currency)","Type Foreign Currency","Exchange Rate"
@@ -239,3 +319,1126 @@ def test_extract_updated_header(importer, filename):
     """,
         transactions,
     )
+
+
+def test_extract_with_account_priorities(filename):
+    """\
+    "Date","Payee","Account number","Transaction type","Payment reference","Category","Amount (EUR)","Amount (Foreign Currency)","Type Foreign Currency","Exchange Rate"
+    "2019-12-28","MAX MUSTERMANN","DE99999999999999999999","Income","Muster GmbH","Income","-56.78","","",""
+    "2020-01-03","MAX MUELLER","DE99999999999999999999","Outgoing Transfer","Muster De payment","Income","-12.34","","",""
+    """
+
+    importer = N26Importer(
+        IBAN_NUMBER,
+        "Assets:N26",
+        account_patterns={
+            "Expenses:Misc": ["MAX"],
+            "Income:Salary": ["MAX MUSTERMANN"],
+        },
+        account_priorities={"Income:Salary": 1},
+    )
+
+    transactions = importer.extract(filename)
+
+    assert [transaction.postings[1].account for transaction in transactions] == [
+        "Income:Salary",
+        "Expenses:Misc",
+    ]
+
+
+def test_raise_on_pattern_conflicts():
+    with pytest.raises(PatternConflictError):
+        N26Importer(
+            IBAN_NUMBER,
+            "Assets:N26",
+            account_patterns={
+                "Expenses:Misc": ["MAX"],
+                "Income:Salary": ["MAX MUSTERMANN"],
+            },
+            check_pattern_conflicts=True,
+        )
+
+    # resolved by trying the longer pattern first
+    importer = N26Importer(
+        IBAN_NUMBER,
+        "Assets:N26",
+        account_patterns={
+            "Expenses:Misc": ["MAX"],
+            "Income:Salary": ["MAX MUSTERMANN"],
+        },
+        account_priorities={"Income:Salary": 1},
+        check_pattern_conflicts=True,
+    )
+
+    assert importer.classify("MAX MUSTERMANN") == "Income:Salary"
+    assert importer.classify("MAX MUSTER") == "Expenses:Misc"
+
+
+def test_pattern_cache(tmp_path, monkeypatch):
+    account_patterns = {
+        "Expenses:Food": ["rewe", r"edeka\ .*"],
+        "Expenses:Misc": ["muster gmbh"],
+    }
+
+    importer = N26Importer(
+        IBAN_NUMBER,
+        "Assets:N26",
+        account_patterns=account_patterns,
+        pattern_cache=str(tmp_path),
+    )
+
+    assert len(list(tmp_path.iterdir())) == 1
+
+    with monkeypatch.context() as patch:
+        patch.setattr(
+            "beancount_n26._build_classifier",
+            lambda *args: pytest.fail("Patterns should be loaded from the cache"),
+        )
+
+        cached = N26Importer(
+            IBAN_NUMBER,
+            "Assets:N26",
+            account_patterns=account_patterns,
+            pattern_cache=str(tmp_path),
+        )
+
+    assert cached.payee_patterns == importer.payee_patterns
+    assert cached.classify("EDEKA Center") == "Expenses:Food"
+    assert cached.classify("Muster GmbH") == "Expenses:Misc"
+
+    # other patterns (or priorities) are cached separately
+    N26Importer(
+        IBAN_NUMBER,
+        "Assets:N26",
+        account_patterns=account_patterns,
+        account_priorities={"Expenses:Misc": 1},
+        pattern_cache=str(tmp_path),
+    )
+
+    assert len(list(tmp_path.iterdir())) == 2
+
+
+def test_import_is_lazy():
+    code = dedent(
+        """
+        import sys
+        import beangulp.importer
+
+        before = set(sys.modules)
+        import beancount_n26
+
+        lazy = {"asyncio", "concurrent.futures", "gzip", "json", "mmap", "sqlite3"}
+        print(sorted(lazy & (set(sys.modules) - before)))
+        """
+    )
+
+    output = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    ).stdout
+
+    assert output.strip() == "[]"
+
+
+def test_iter_extract_source(importer, filename):
+    """\
+    "Date","Payee","Account number","Transaction type","Payment reference","Category","Amount (EUR)","Amount (Foreign Currency)","Type Foreign Currency","Exchange Rate"
+    "2019-12-28","MAX MUSTERMANN","DE99999999999999999999","Income","Muster GmbH","Income","-56.78","","",""
+    "2020-01-05","Muster SARL","DE99999999999999999999","Outgoing Transfer","Muster Fr
+    payment","Income","-42.24","","",""
+    """
+
+    transactions = importer.iter_extract(filename)
+
+    first = next(transactions)
+    assert first.meta["lineno"] == 0
+    assert first.meta["__source__"] == (
+        '"2019-12-28","MAX MUSTERMANN","DE99999999999999999999","Income",'
+        '"Muster GmbH","Income","-56.78","","",""'
+    )
+
+    second = next(transactions)
+    assert second.narration == "Muster Fr\npayment"
+    assert second.meta["lineno"] == 1
+    assert second.meta["__source__"] == (
+        '"2020-01-05","Muster SARL","DE99999999999999999999","Outgoing Transfer",'
+        '"Muster Fr\npayment","Income","-42.24","","",""'
+    )
+
+    assert next(transactions, None) is None
+
+
+def test_file_session(importer, filename, monkeypatch):
+    """\
+    "Date","Payee","Account number","Transaction type","Payment reference","Category","Amount (EUR)","Amount (Foreign Currency)","Type Foreign Currency","Exchange Rate"
+    "2019-10-10","Muster GmbH","DE99999999999999999999","Outgoing Transfer","Muster payment","Miscellaneous","-12.34","","",""
+    """
+
+    opened = []
+    original_open = open
+    original_os_open = os.open
+
+    def counting_open(file, *args, **kwargs):
+        opened.append(file)
+        return original_open(file, *args, **kwargs)
+
+    def counting_os_open(file, *args, **kwargs):
+        opened.append(file)
+        return original_os_open(file, *args, **kwargs)
+
+    monkeypatch.setattr("builtins.open", counting_open)
+    monkeypatch.setattr("os.open", counting_os_open)
+
+    assert importer.identify(filename)
+    assert importer.date(filename) == datetime.date(2019, 10, 10)
+    assert len(importer.extract(filename)) == 1
+
+    # once for the header, once for the rows
+    assert opened == [filename, filename]
+
+    with original_open(filename, "a") as file:
+        file.write(
+            '"2019-10-11","Muster GmbH","DE99999999999999999999","Outgoing Transfer",'
+            '"Muster payment","Miscellaneous","-1.00","","",""\n'
+        )
+
+    assert importer.date(filename) == datetime.date(2019, 10, 11)
+    assert len(importer.extract(filename)) == 2
+
+
+@pytest.mark.parametrize("newline", ["\n", "\r\n"])
+def test_extract_mmap(importer, filename, newline):
+    """\
+    "Booking Date","Value Date","Partner Name","Partner Iban",Type,"Payment Reference","Account Name","Amount (EUR)","Original Amount","Original Currency","Exchange Rate"
+    2019-10-10,2019-10-10,Muster GmbH,DE99999999999999999999,Presentment,Muster payment,"Main Account",-12.34,,,
+    2019-11-02,2019-11-02,"Muster, SARL",FR99999999999999999999,Presentment,"Muster Fr
+    payment","Main Account",-42.24,-45.00,USD,0.9386666667
+
+    2019-12-01,2019-12-01,"Muster ""Bar"" GmbH",DE99999999999999999999,Presentment,,"Main Account",-1.00,,,
+    """
+
+    with open(filename, newline="") as f:
+        contents = f.read()
+
+    with open(filename, "w", newline="") as f:
+        f.write(contents.replace("\n", newline))
+
+    mapped = N26Importer(
+        IBAN_NUMBER, "Assets:N26", language="en", use_mmap=True
+    ).extract(filename)
+    expected = importer.extract(filename)
+
+    assert mapped == expected
+    assert [str(entry.meta["__source__"]) for entry in mapped] == [
+        entry.meta["__source__"] for entry in expected
+    ]
+    assert pickle.loads(pickle.dumps(mapped)) == expected
+    assert mapped[1].payee == "Muster, SARL"
+    assert mapped[1].narration == "Muster Fr\npayment"
+    assert mapped[2].payee == 'Muster "Bar" GmbH'
+
+
+def test_extract_cache(importer, filename, tmp_path, monkeypatch):
+    """\
+    "Booking Date","Value Date","Partner Name","Partner Iban",Type,"Payment Reference","Account Name","Amount (EUR)","Original Amount","Original Currency","Exchange Rate"
+    2019-10-10,2019-10-10,Muster GmbH,DE99999999999999999999,Presentment,Muster payment,"Main Account",-12.34,,,
+    2019-11-02,2019-11-02,"Muster, SARL",FR99999999999999999999,Presentment,"Muster Fr payment","Main Account",-42.24,-45.00,USD,0.9386666667
+    """
+
+    cache = tmp_path / "cache"
+    account_patterns = {"Expenses:Misc": ["muster gmbh"]}
+
+    def cached_importer(**kwargs):
+        return N26Importer(
+            IBAN_NUMBER,
+            "Assets:N26",
+            account_patterns=account_patterns,
+            extract_cache=str(cache),
+            **kwargs,
+        )
+
+    expected = cached_importer().extract(filename)
+
+    assert len(list(cache.iterdir())) == 1
+
+    with monkeypatch.context() as patch:
+        patch.setattr(
+            N26Importer,
+            "_iter_rows",
+            lambda *args: pytest.fail("Transactions should be read from the cache"),
+        )
+
+        cached = cached_importer().extract(filename)
+
+    assert cached == expected
+    assert [entry.meta["__source__"] for entry in cached] == [
+        entry.meta["__source__"] for entry in expected
+    ]
+    assert cached[0].postings[1].account == "Expenses:Misc"
+
+    # other options (or files) are cached separately
+    account_patterns = {"Expenses:Food": ["muster gmbh"]}
+
+    assert cached_importer().extract(filename)[0].postings[1].account == (
+        "Expenses:Food"
+    )
+    assert len(list(cache.iterdir())) == 2
+
+    # the transactions are cached before skipping imported ones
+    index = str(tmp_path / "index.sqlite")
+
+    assert len(cached_importer(fingerprint_index=index).extract(filename)) == 2
+    assert cached_importer(fingerprint_index=index).extract(filename) == []
+
+    # the least recently used entries are removed once the cache is full
+    account_patterns = {}
+    cached_importer(extract_cache_size=0).extract(filename)
+
+    assert list(cache.iterdir()) == []
+
+
+@pytest.mark.parametrize("max_cached_rows_size", [0, 4 * 1024 * 1024])
+def test_date_unsorted(importer, filename, monkeypatch, max_cached_rows_size):
+    """\
+    "Booking Date","Value Date","Partner Name","Partner Iban",Type,"Payment Reference","Account Name","Amount (EUR)","Original Amount","Original Currency","Exchange Rate"
+    2019-10-10,2019-10-10,Muster GmbH,DE99999999999999999999,Presentment,Muster payment,"Main Account",-12.34,,,
+    2019-12-01,2019-10-10,Muster GmbH,DE99999999999999999999,Presentment,Muster payment,"Main Account",-12.34,,,
+    2019-11-10,2019-12-24,Muster GmbH,DE99999999999999999999,Presentment,Muster payment,"Main Account",-12.34,,,
+    """
+
+    monkeypatch.setattr(
+        "beancount_n26._FileSession.MAX_CACHED_ROWS_SIZE", max_cached_rows_size
+    )
+
+    assert importer.date(filename) == datetime.date(2019, 12, 1)
+
+
+def test_date_not_zero_padded(importer, filename):
+    """\
+    "Date","Payee","Account number","Transaction type","Payment reference","Category","Amount (EUR)","Amount (Foreign Currency)","Type Foreign Currency","Exchange Rate"
+    "2019-10-10","Muster GmbH","DE99999999999999999999","Outgoing Transfer","Muster payment","Miscellaneous","-12.34","","",""
+    "2019-9-30","Muster GmbH","DE99999999999999999999","Outgoing Transfer","Muster payment","Miscellaneous","-12.34","","",""
+    """
+
+    assert importer.date(filename) == datetime.date(2019, 10, 10)
+
+
+def test_identify_wrong_language(importer, filename):
+    """\
+    "Datum","Empfänger","Kontonummer","Transaktionstyp","Verwendungszweck","Kategorie","Betrag (EUR)","Betrag (Fremdwährung)","Fremdwährung","Wechselkurs"
+    "2019-10-10","MAX MUSTERMANN","DE99999999999999999999","Outgoing Transfer","Muster GmbH","Sonstiges","-12.34","","",""
+    """
+
+    assert not importer.identify(filename)
+
+
+def test_extract_detect_language(filename):
+    """\
+    "Datum","Empfänger","Kontonummer","Transaktionstyp","Verwendungszweck","Kategorie","Betrag (EUR)","Betrag (Fremdwährung)","Fremdwährung","Wechselkurs"
+    "2019-10-10","MAX MUSTERMANN","DE99999999999999999999","Outgoing Transfer","Muster GmbH","Sonstiges","-12.34","","",""
+    """
+
+    importer = N26Importer(IBAN_NUMBER, "Assets:N26", language=None)
+
+    assert importer.identify(filename)
+    assert_equal_entries(
+        r"""
+      2019-10-10 * "MAX MUSTERMANN" "Muster GmbH"
+        Assets:N26  -12.34 EUR
+    """,
+        importer.extract(filename),
+    )
+
+
+def test_router(filename, monkeypatch):
+    """\
+    "Booking Date","Value Date","Partner Name","Partner Iban",Type,"Payment Reference","Account Name","Amount (EUR)","Original Amount","Original Currency","Exchange Rate"
+    2019-10-10,2019-10-10,Muster GmbH,DE99999999999999999999,Presentment,Muster payment,"Main Account",-12.34,,,
+    2019-10-11,2019-10-11,Main Account,,Space Transfer,Savings,Savings,100.00,,,
+    2019-10-11,2019-10-11,Savings,,Space Transfer,Savings,"Main Account",-100.00,,,
+    2019-10-12,2019-10-12,Muster GmbH,DE99999999999999999999,Presentment,Muster payment,"Shared",-1.00,,,
+    """
+
+    main = N26Importer(
+        IBAN_NUMBER,
+        "Assets:N26:Main",
+        account_patterns={"Expenses:Misc": ["Muster GmbH"]},
+    )
+    savings = N26Importer(IBAN_NUMBER, "Assets:N26:Savings")
+
+    router = N26Router({"Main Account": main, "Savings": savings})
+
+    opened = []
+    original_open = open
+    original_os_open = os.open
+
+    def counting_open(file, *args, **kwargs):
+        opened.append(file)
+        return original_open(file, *args, **kwargs)
+
+    def counting_os_open(file, *args, **kwargs):
+        opened.append(file)
+        return original_os_open(file, *args, **kwargs)
+
+    monkeypatch.setattr("builtins.open", counting_open)
+    monkeypatch.setattr("os.open", counting_os_open)
+
+    assert router.identify(filename)
+    assert router.date(filename) == datetime.date(2019, 10, 12)
+    assert router.account(filename) == "Assets:N26:Main"
+
+    transactions = router.extract(filename)
+
+    # once for the header, once for the rows
+    assert opened == [filename, filename]
+    assert [t.meta["lineno"] for t in transactions] == [0, 1, 2]
+    assert [t.postings[0].account for t in transactions] == [
+        "Assets:N26:Main",
+        "Assets:N26:Savings",
+        "Assets:N26:Main",
+    ]
+    assert transactions[0].postings[1].account == "Expenses:Misc"
+
+    router.default = savings
+    assert len(router.extract(filename)) == 4
+
+
+def test_router_unknown_accounts(importer, filename):
+    """\
+    "Booking Date","Value Date","Partner Name","Partner Iban",Type,"Payment Reference","Account Name","Amount (EUR)","Original Amount","Original Currency","Exchange Rate"
+    2019-10-10,2019-10-10,Muster GmbH,DE99999999999999999999,Presentment,Muster payment,"Other",-12.34,,,
+    """
+
+    router = N26Router({"Main Account": importer})
+
+    assert not router.identify(filename)
+    assert router.account(filename) is None
+
+    router.default = importer
+
+    assert router.identify(filename)
+    assert router.account(filename) == "Assets:N26"
+
+
+def test_router_mmap(filename):
+    """\
+    "Booking Date","Value Date","Partner Name","Partner Iban",Type,"Payment Reference","Account Name","Amount (EUR)","Original Amount","Original Currency","Exchange Rate"
+    2019-10-10,2019-10-10,Muster GmbH,DE99999999999999999999,Presentment,Muster payment,"Main Account",-12.34,,,
+    2019-10-11,2019-10-11,Main Account,,Space Transfer,Savings,Savings,100.00,,,
+    """
+
+    accounts = {
+        "Main Account": N26Importer(IBAN_NUMBER, "Assets:N26:Main"),
+        "Savings": N26Importer(IBAN_NUMBER, "Assets:N26:Savings"),
+    }
+
+    expected = N26Router(accounts).extract(filename)
+    router = N26Router(accounts, use_mmap=True)
+
+    assert router.account(filename) == "Assets:N26:Main"
+    assert router.extract(filename) == expected
+    assert len(expected) == 2
+
+
+def test_router_older_layout(importer, filename):
+    """\
+    "Date","Payee","Account number","Transaction type","Payment reference","Category","Amount (EUR)","Amount (Foreign Currency)","Type Foreign Currency","Exchange Rate"
+    "2019-10-10","Muster GmbH","DE99999999999999999999","Outgoing Transfer","Muster payment","Miscellaneous","-12.34","","",""
+    """
+
+    assert not N26Router({"Main Account": importer}).identify(filename)
+
+    router = N26Router({}, default=importer)
+
+    assert router.identify(filename)
+    assert router.extract(filename) == importer.extract(filename)
+
+
+@pytest.mark.parametrize("use_mmap", [False, True])
+@pytest.mark.parametrize("workers", [1, 2])
+def test_extract_many(tmp_path, workers, use_mmap):
+    header = (
+        '"Date","Payee","Account number","Transaction type","Payment reference",'
+        '"Category","Amount (EUR)","Amount (Foreign Currency)",'
+        '"Type Foreign Currency","Exchange Rate"\n'
+    )
+    contents = {
+        "2019-10.csv": (
+            '"2019-10-10","Muster GmbH","DE99999999999999999999",'
+            '"Outgoing Transfer","Muster payment","Income","-12.34","","",""\n'
+        ),
+        "2019-11.csv": (
+            '"2019-11-10","MAX MUSTERMANN","DE99999999999999999999",'
+            '"Income","Muster GmbH","Income","-56.78","","",""\n'
+            '"2019-11-11","Muster GmbH","DE99999999999999999999",'
+            '"Outgoing Transfer","Muster payment","Income","-1.00","","",""\n'
+        ),
+        "2019-12.csv": (
+            '"2019-12-10","Muster GmbH","DE99999999999999999999",'
+            '"Outgoing Transfer","Muster payment","Income","invalid","","",""\n'
+        ),
+    }
+
+    filepaths = []
+    for name, rows in contents.items():
+        (tmp_path / name).write_text(header + rows)
+        filepaths.append(str(tmp_path / name))
+
+    importer = N26Importer(
+        IBAN_NUMBER,
+        "Assets:N26",
+        account_patterns={"Income:Salary": ["MAX MUSTERMANN"]},
+        use_mmap=use_mmap,
+    )
+
+    results = importer.extract_many(filepaths, workers=workers)
+
+    assert [result.filepath for result in results] == filepaths
+    assert [len(result.entries) for result in results] == [1, 2, 0]
+    assert results[1].entries[0].postings[1].account == "Income:Salary"
+    assert [result.error is None for result in results] == [True, True, False]
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_extract_many_fingerprint_index(tmp_path, workers):
+    header = (
+        '"Date","Payee","Account number","Transaction type","Payment reference",'
+        '"Category","Amount (EUR)","Amount (Foreign Currency)",'
+        '"Type Foreign Currency","Exchange Rate"\n'
+    )
+    coffee = (
+        '"2019-10-31","Cafe","DE99999999999999999999",'
+        '"Outgoing Transfer","Coffee","Food","-3.50","","",""\n'
+    )
+    rent = (
+        '"2019-11-01","Landlord","DE99999999999999999999",'
+        '"Outgoing Transfer","Rent","Rent","-500.00","","",""\n'
+    )
+
+    filepaths = []
+    for name, rows in [("october.csv", coffee * 3), ("november.csv", coffee + rent)]:
+        (tmp_path / name).write_text(header + rows)
+        filepaths.append(str(tmp_path / name))
+
+    importer = N26Importer(
+        IBAN_NUMBER,
+        "Assets:N26",
+        fingerprint_index=str(tmp_path / "index.sqlite"),
+    )
+
+    results = importer.extract_many(filepaths, workers=workers)
+
+    assert [len(result.entries) for result in results] == [3, 1]
+    assert results[1].entries[0].narration == "Rent"
+    assert [len(result.entries) for result in importer.extract_many(filepaths)] == [
+        0,
+        0,
+    ]
+
+
+@pytest.mark.parametrize("newline", ["\n", "\r\n"])
+@pytest.mark.parametrize(
+    ("workers", "shards"), [(1, 2), (1, 3), (1, 5), (1, 100), (2, 4)]
+)
+def test_extract_sharded(tmp_path, workers, shards, newline):
+    header = (
+        '"Booking Date","Value Date","Partner Name","Partner Iban",Type,'
+        '"Payment Reference","Account Name","Amount (EUR)","Original Amount",'
+        '"Original Currency","Exchange Rate"\n'
+    )
+    rows = (
+        "2019-10-10,2019-10-10,Muster GmbH,DE99999999999999999999,Presentment,"
+        'Muster payment,"Main Account",-12.34,,,\n'
+        '2019-11-02,2019-11-02,"Muster, SARL",FR99999999999999999999,Presentment,'
+        '"Muster Fr\npayment","Main Account",-42.24,-45.00,USD,0.9386666667\n'
+        "\n"
+        '2019-12-01,2019-12-01,"Muster ""Bar"" GmbH",DE99999999999999999999,'
+        'Presentment,"Muster ""1""\n\n""2""","Main Account",-1.00,,,\n'
+    )
+    filepath = tmp_path / "export.csv"
+    filepath.write_bytes((header + rows * 4).replace("\n", newline).encode())
+
+    importer = N26Importer(
+        IBAN_NUMBER,
+        "Assets:N26",
+        account_patterns={"Expenses:Misc": ["muster gmbh"]},
+    )
+    expected = importer.extract(str(filepath))
+    sharded = importer.extract_sharded(str(filepath), workers=workers, shards=shards)
+
+    assert sharded == expected
+    assert [entry.meta["__source__"] for entry in sharded] == [
+        entry.meta["__source__"] for entry in expected
+    ]
+    assert [entry.meta["lineno"] for entry in sharded] == list(range(12))
+    assert sharded[1].narration == "Muster Fr\npayment"
+
+
+def test_extract_sharded_fingerprint_index(tmp_path, filename):
+    """\
+    "Date","Payee","Account number","Transaction type","Payment reference","Category","Amount (EUR)","Amount (Foreign Currency)","Type Foreign Currency","Exchange Rate"
+    "2019-12-28","MAX MUSTERMANN","DE99999999999999999999","Income","Muster GmbH","Income","-56.78","","",""
+    "2019-12-28","MAX MUSTERMANN","DE99999999999999999999","Income","Muster GmbH","Income","-56.78","","",""
+    "2020-01-03","Muster GmbH","DE99999999999999999999","Outgoing Transfer","Muster De payment","Income","-12.34","","",""
+    """
+
+    importer = N26Importer(
+        IBAN_NUMBER,
+        "Assets:N26",
+        fingerprint_index=str(tmp_path / "index.sqlite"),
+    )
+
+    assert len(importer.extract_sharded(filename, workers=1, shards=3)) == 3
+    assert importer.extract_sharded(filename, workers=1, shards=3) == []
+
+
+def test_aextract(importer, filename):
+    """\
+    "Date","Payee","Account number","Transaction type","Payment reference","Category","Amount (EUR)","Amount (Foreign Currency)","Type Foreign Currency","Exchange Rate"
+    "2019-12-28","MAX MUSTERMANN","DE99999999999999999999","Income","Muster GmbH","Income","-56.78","","",""
+    "2020-01-05","Muster SARL","DE99999999999999999999","Outgoing Transfer","Muster Fr payment","Income","-42.24","","",""
+    "2020-01-03","Muster GmbH","DE99999999999999999999","Outgoing Transfer","Muster De payment","Income","-12.34","","",""
+    """
+
+    with open(filename, "rb") as f:
+        contents = f.read()
+
+    async def upload():
+        for start in range(0, len(contents), 100):
+            await asyncio.sleep(0)
+            yield contents[start : start + 100]
+
+    async def main():
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            assert await importer.aidentify(filename, executor)
+            assert await importer.adate(upload(), executor) == datetime.date(2020, 1, 5)
+
+            from_path = await importer.aextract(filename, executor=executor)
+            from_upload = await importer.aextract(upload(), chunk_size=2)
+
+            transactions = importer.aiter_extract(filename, chunk_size=1)
+            first = await transactions.__anext__()
+            await transactions.aclose()
+
+        return from_path, from_upload, first
+
+    from_path, from_upload, first = asyncio.run(main())
+    expected = importer.extract(filename)
+
+    assert from_path == expected
+    assert [t.postings for t in from_upload] == [t.postings for t in expected]
+    assert first == expected[0]
+
+
+def test_aextract_process_pool(importer, filename):
+    """\
+    "Date","Payee","Account number","Transaction type","Payment reference","Category","Amount (EUR)","Amount (Foreign Currency)","Type Foreign Currency","Exchange Rate"
+    "2019-12-28","MAX MUSTERMANN","DE99999999999999999999","Income","Muster GmbH","Income","-56.78","","",""
+    "2020-01-05","Muster SARL","DE99999999999999999999","Outgoing Transfer","Muster Fr payment","Income","-42.24","","",""
+    """
+
+    with open(filename, "rb") as f:
+        contents = f.read()
+
+    async def upload():
+        for start in range(0, len(contents), 100):
+            yield contents[start : start + 100]
+
+    async def main():
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            assert await importer.aidentify(upload(), executor)
+            assert await importer.adate(upload(), executor) == datetime.date(2020, 1, 5)
+
+            return await importer.aextract(upload(), executor=executor)
+
+    from_upload = asyncio.run(main())
+
+    assert [t.postings for t in from_upload] == [
+        t.postings for t in importer.extract(filename)
+    ]
+
+
+def test_extract_incremental(tmp_path):
+    header = (
+        '"Date","Payee","Account number","Transaction type","Payment reference",'
+        '"Category","Amount (EUR)","Amount (Foreign Currency)",'
+        '"Type Foreign Currency","Exchange Rate"\n'
+    )
+    coffee = (
+        '"2019-10-31","Cafe","DE99999999999999999999",'
+        '"Outgoing Transfer","Coffee","Food","-3.50","","",""\n'
+    )
+    rent = (
+        '"2019-11-01","Landlord","DE99999999999999999999",'
+        '"Outgoing Transfer","Rent","Rent","-500.00","","",""\n'
+    )
+
+    october = tmp_path / "october.csv"
+    october.write_text(header + coffee + coffee)
+    november = tmp_path / "november.csv"
+    november.write_text(header + coffee + coffee + coffee + rent)
+
+    importer = N26Importer(
+        IBAN_NUMBER,
+        "Assets:N26",
+        fingerprint_index=str(tmp_path / "fingerprints.sqlite"),
+    )
+
+    assert len(importer.extract(str(october))) == 2
+    assert len(importer.extract(str(october))) == 0
+
+    transactions = importer.extract(str(november))
+
+    assert [(t.narration, t.meta["lineno"]) for t in transactions] == [
+        ("Coffee", 2),
+        ("Rent", 3),
+    ]
+
+
+def test_extract_commit_fingerprints(importer, filename, tmp_path):
+    """\
+    "Date","Payee","Account number","Transaction type","Payment reference","Category","Amount (EUR)","Amount (Foreign Currency)","Type Foreign Currency","Exchange Rate"
+    "2019-12-28","MAX MUSTERMANN","DE99999999999999999999","Income","Muster GmbH","Income","-56.78","","",""
+    "2020-01-05","Muster SARL","DE99999999999999999999","Outgoing Transfer","Muster Fr payment","Income","-42.0","","",""
+    """
+
+    index = str(tmp_path / "fingerprints.sqlite")
+
+    def dry_run_importer():
+        return N26Importer(
+            IBAN_NUMBER,
+            "Assets:N26",
+            fingerprint_index=index,
+            commit_fingerprints=False,
+        )
+
+    dry_run = dry_run_importer()
+
+    assert len(dry_run.extract(filename)) == 2
+    assert dry_run.extract(filename) == []
+    assert len(dry_run.fingerprint_index) == 2
+
+    dry_run.fingerprint_index.rollback()
+
+    assert len(dry_run.extract(filename)) == 2
+    assert len(dry_run_importer().extract(filename)) == 2
+
+    dry_run.fingerprint_index.commit()
+
+    assert dry_run_importer().extract(filename) == []
+
+
+def test_extract_skip_existing(importer, filename, tmp_path):
+    """\
+    "Date","Payee","Account number","Transaction type","Payment reference","Category","Amount (EUR)","Amount (Foreign Currency)","Type Foreign Currency","Exchange Rate"
+    "2019-12-28","MAX MUSTERMANN","DE99999999999999999999","Income","Muster GmbH","Income","-56.78","","",""
+    "2020-01-05","Muster SARL","DE99999999999999999999","Outgoing Transfer","Muster Fr payment","Income","-42.0","","",""
+    """
+
+    existing = importer.extract(filename)[1:]
+
+    importer = N26Importer(
+        IBAN_NUMBER,
+        "Assets:N26",
+        fingerprint_index=str(tmp_path / "fingerprints.sqlite"),
+    )
+
+    transactions = importer.extract(filename, existing)
+
+    assert [t.payee for t in transactions] == ["MAX MUSTERMANN"]
+
+
+def test_iter_records(filename):
+    """\
+    "Date","Payee","Account number","Transaction type","Payment reference","Category","Amount (EUR)","Amount (Foreign Currency)","Type Foreign Currency","Exchange Rate"
+    "2022-08-01","Alice","DE99999999999999999999","Income","Muster GmbH","Income","56.780","","",""
+    "2022-08-03","Charlie","DE99999999999999999999","Outgoing Transfer in a foreign currency","Foreign food","Bar","-10.0","9.13","CHF","1.25"
+    "2022-08-04","Mustermann GmbH","DE99999999999999999999","-","MasterCard Payment","-","-12.21","-12.21","EUR","1.0"
+    """
+
+    importer = N26Importer(
+        IBAN_NUMBER,
+        "Assets:N26",
+        account_patterns={"Income:Salary": ["alice"]},
+    )
+
+    records = list(importer.iter_records(filename))
+
+    assert [record.date for record in records] == [
+        datetime.date(2022, 8, 1),
+        datetime.date(2022, 8, 3),
+        datetime.date(2022, 8, 4),
+    ]
+    assert [(record.amount_units, record.amount_exponent) for record in records] == [
+        (56780, 3),
+        (-100, 1),
+        (-1221, 2),
+    ]
+    assert [str(record.amount) for record in records] == ["56.780", "-10.0", "-12.21"]
+    assert [(record.currency, record.exchange_rate) for record in records] == [
+        (None, None),
+        ("CHF", "1.25"),
+        (None, None),
+    ]
+
+    transactions = [
+        importer.build_transaction(filename, record)
+        for record in records
+        if record.amount_units < 0
+    ]
+
+    assert transactions == importer.extract(filename)[1:]
+
+
+def test_extract_shared_exchange_rates(importer, filename):
+    """\
+    "Date","Payee","Account number","Transaction type","Payment reference","Category","Amount (EUR)","Amount (Foreign Currency)","Type Foreign Currency","Exchange Rate"
+    "2022-08-03","Charlie","DE99999999999999999999","Outgoing Transfer in a foreign currency","Foreign food","Bar","-10.0","-12.5","CHF","0.8"
+    "2022-08-03","Charlie","DE99999999999999999999","Outgoing Transfer in a foreign currency","Foreign food","Bar","-20.00","-25.00","CHF","0.8"
+    "2022-08-03","Dave","DE99999999999999999999","Outgoing Transfer in a foreign currency","Foreign food","Bar","-3","-3.6","USD","0.8333"
+    """
+
+    transactions = importer.extract(filename)
+    units = [t.postings[0].units for t in transactions]
+    prices = [t.postings[0].price for t in transactions]
+
+    assert [str(amount.number) for amount in units] == ["-10.0", "-20.00", "-3"]
+    assert [price.number for price in prices] == [
+        1 / Decimal("0.8"),
+        1 / Decimal("0.8"),
+        1 / Decimal("0.8333"),
+    ]
+    assert [price.currency for price in prices] == ["CHF", "CHF", "USD"]
+    assert prices[0] is prices[1]
+
+
+def test_extract_negative_zero(importer, filename):
+    """\
+    "Date","Payee","Account number","Transaction type","Payment reference","Category","Amount (EUR)","Amount (Foreign Currency)","Type Foreign Currency","Exchange Rate"
+    "2022-08-03","Charlie","DE99999999999999999999","Outgoing Transfer","Food","Bar","-0.00","","",""
+    "2022-08-03","Charlie","DE99999999999999999999","Outgoing Transfer","Food","Bar","0.00","","",""
+    "2022-08-03","Charlie","DE99999999999999999999","Outgoing Transfer","Food","Bar","-0E+2","","",""
+    """
+
+    transactions = importer.extract(filename)
+
+    assert [str(t.postings[0].units.number) for t in transactions] == [
+        "-0.00",
+        "0.00",
+        "-0E+2",
+    ]
+
+
+def test_extract_full_amount_cache(importer, filename, monkeypatch):
+    """\
+    "Date","Payee","Account number","Transaction type","Payment reference","Category","Amount (EUR)","Amount (Foreign Currency)","Type Foreign Currency","Exchange Rate"
+    "2022-08-03","Charlie","DE99999999999999999999","Outgoing Transfer","Food","Bar","-10.00","","",""
+    "2022-08-03","Charlie","DE99999999999999999999","Outgoing Transfer","Food","Bar","-10.00","","",""
+    "2022-08-03","Charlie","DE99999999999999999999","Outgoing Transfer","Food","Bar","-10.00","","",""
+    "2022-08-03","Dave","DE99999999999999999999","Outgoing Transfer","Food","Bar","-3.00","","",""
+    """
+
+    monkeypatch.setattr("beancount_n26._BATCH_SIZE", 2)
+    importer._amount_converter.maxsize = 1
+
+    transactions = importer.extract(filename)
+
+    assert [str(t.postings[0].units.number) for t in transactions] == [
+        "-10.00",
+        "-10.00",
+        "-10.00",
+        "-3.00",
+    ]
+
+
+def test_classification_cache(filename):
+    """\
+    "Date","Payee","Account number","Transaction type","Payment reference","Category","Amount (EUR)","Amount (Foreign Currency)","Type Foreign Currency","Exchange Rate"
+    "2019-12-28","MAX MUSTERMANN","DE99999999999999999999","Income","Muster GmbH","Income","-56.78","","",""
+    "2020-01-05","Muster SARL","DE99999999999999999999","Outgoing Transfer","Muster Fr payment","Income","-42.24","","",""
+    "2020-01-03","MAX MUSTERMANN","DE99999999999999999999","Outgoing Transfer","Muster De payment","Income","-12.34","","",""
+    """
+
+    importer = N26Importer(
+        IBAN_NUMBER,
+        "Assets:N26",
+        account_patterns={"Expenses:Misc": ["MAX MUSTERMANN"]},
+        classification_cache_size=16,
+    )
+
+    transactions = importer.extract(filename)
+
+    assert [len(transaction.postings) for transaction in transactions] == [2, 1, 2]
+    assert importer.classification_cache_info() == (1, 2, 16, 2)
+
+    importer.extract(filename)
+
+    assert importer.classification_cache_info() == (4, 2, 16, 2)
+
+
+def test_collect_stats(filename, caplog):
+    """\
+    "Date","Payee","Account number","Transaction type","Payment reference","Category","Amount (EUR)","Amount (Foreign Currency)","Type Foreign Currency","Exchange Rate"
+    "2019-12-28","MAX MUSTERMANN","DE99999999999999999999","Income","Muster GmbH","Income","-56.78","","",""
+    "2020-01-05","Muster SARL","DE99999999999999999999","Outgoing Transfer","Muster Fr payment","Income","-42.24","-45.00","USD","0.9386"
+    "2020-01-03","MAX MUSTERMANN","DE99999999999999999999","Outgoing Transfer","Muster De payment","Income","-12.34","","",""
+    """
+
+    importer = N26Importer(
+        IBAN_NUMBER,
+        "Assets:N26",
+        account_patterns={"Expenses:Misc": ["MAX MUSTERMANN"]},
+        collect_stats=True,
+    )
+
+    with caplog.at_level("DEBUG", logger="beancount_n26"):
+        importer.extract(filename)
+
+    stats = importer.stats[filename]
+
+    assert set(stats.timings) == {
+        "header",
+        "parse",
+        "dates",
+        "amounts",
+        "classification",
+    }
+    assert stats.counters == {
+        "rows": 3,
+        "skipped": 0,
+        "matched": 2,
+        "cache_hits": 1,
+        "classifier_calls": 2,
+    }
+    assert caplog.records[-1].n26_stats == stats.as_dict()
+
+
+def test_no_stats(importer, filename):
+    """\
+    "Date","Payee","Account number","Transaction type","Payment reference","Category","Amount (EUR)","Amount (Foreign Currency)","Type Foreign Currency","Exchange Rate"
+    "2019-12-28","MAX MUSTERMANN","DE99999999999999999999","Income","Muster GmbH","Income","-56.78","","",""
+    """
+
+    importer.extract(filename)
+
+    assert importer.stats == {}
+
+
+def test_summary_stats(filename):
+    """\
+    "Date","Payee","Account number","Transaction type","Payment reference","Category","Amount (EUR)","Amount (Foreign Currency)","Type Foreign Currency","Exchange Rate"
+    "2019-12-28","MAX MUSTERMANN","DE99999999999999999999","Income","Muster GmbH","Income","1000.00","","",""
+    "2020-01-05","Muster GmbH","DE99999999999999999999","Outgoing Transfer","Muster payment","Income","-42.24","","",""
+    "2020-01-20","Muster SARL","DE99999999999999999999","Outgoing Transfer","Muster payment","Income","-1.00","","",""
+    """
+
+    importer = N26Importer(
+        IBAN_NUMBER,
+        "Assets:N26",
+        account_patterns={"Expenses:Misc": ["Muster GmbH"]},
+        collect_stats=True,
+        summary_period="month",
+    )
+
+    transactions = importer.extract(filename)
+
+    # every row is classified once, for both its transaction and the summary
+    assert importer.stats[filename].counters["cache_hits"] == 0
+    assert importer.stats[filename].counters["classifier_calls"] == 3
+    assert transactions[1].postings[1].account == "Expenses:Misc"
+    assert importer.summaries[filename].accounts[
+        datetime.date(2020, 1, 1), "Expenses:Misc"
+    ] == Decimal("-42.24")
+
+
+def test_summary(tmp_path, filename):
+    """\
+    "Date","Payee","Account number","Transaction type","Payment reference","Category","Amount (EUR)","Amount (Foreign Currency)","Type Foreign Currency","Exchange Rate"
+    "2020-02-03","Muster GmbH","DE99999999999999999999","Outgoing Transfer","Muster payment","Income","-12.34","","",""
+    "2019-12-28","MAX MUSTERMANN","DE99999999999999999999","Income","Muster GmbH","Income","1000.00","","",""
+    "2020-01-05","Muster GmbH","DE99999999999999999999","Outgoing Transfer","Muster payment","Income","-42.24","","",""
+    "2020-01-20","Muster SARL","DE99999999999999999999","Outgoing Transfer","Muster payment","Income","-1.00","-1.10","USD","0.9090909091"
+    """
+
+    importer = N26Importer(
+        IBAN_NUMBER,
+        "Assets:N26",
+        account_patterns={"Expenses:Misc": ["Muster GmbH"]},
+        fingerprint_index=str(tmp_path / "index.sqlite"),
+        summary_period="month",
+        opening_balance={filename: Decimal("100.00")},
+    )
+
+    entries = importer.extract(filename)
+    transactions = [e for e in entries if isinstance(e, data.Transaction)]
+    balances = [e for e in entries if isinstance(e, data.Balance)]
+
+    assert len(transactions) == 4
+    assert [(b.date, b.account, b.amount) for b in balances] == [
+        (datetime.date(2020, 1, 1), "Assets:N26", Amount(Decimal("1100.00"), "EUR")),
+        (datetime.date(2020, 2, 1), "Assets:N26", Amount(Decimal("1056.76"), "EUR")),
+    ]
+
+    summary = importer.summaries[filename]
+
+    assert summary.balance == Decimal("1044.42")
+    assert [(p.start, p.total, p.count) for p in summary.periods] == [
+        (datetime.date(2019, 12, 1), Decimal("1000.00"), 1),
+        (datetime.date(2020, 1, 1), Decimal("-43.24"), 2),
+        (datetime.date(2020, 2, 1), Decimal("-12.34"), 1),
+    ]
+    assert summary.accounts == {
+        (datetime.date(2019, 12, 1), None): Decimal("1000.00"),
+        (datetime.date(2020, 1, 1), "Expenses:Misc"): Decimal("-42.24"),
+        (datetime.date(2020, 1, 1), None): Decimal("-1.00"),
+        (datetime.date(2020, 2, 1), "Expenses:Misc"): Decimal("-12.34"),
+    }
+
+    # rows imported before still count towards the balance, but their balance
+    # assertions aren't returned again
+    assert importer.extract(filename) == []
+    assert importer.summaries[filename].balance == Decimal("1044.42")
+    assert importer.summaries[filename].balances("Assets:N26") == []
+
+    # without opening balance, only the summary is collected
+    importer.opening_balance = None
+
+    assert importer.extract(filename) == []
+    assert importer.summaries[filename].periods[-1].closing == Decimal("944.42")
+
+
+def test_summary_sharded(tmp_path, filename):
+    """\
+    "Date","Payee","Account number","Transaction type","Payment reference","Category","Amount (EUR)","Amount (Foreign Currency)","Type Foreign Currency","Exchange Rate"
+    "2019-12-28","MAX MUSTERMANN","DE99999999999999999999","Income","Muster GmbH","Income","1000.00","","",""
+    "2020-01-05","Muster GmbH","DE99999999999999999999","Outgoing Transfer","Muster payment","Income","-42.24","","",""
+    "2020-01-20","Muster SARL","DE99999999999999999999","Outgoing Transfer","Muster payment","Income","-1.00","","",""
+    "2020-02-03","Muster GmbH","DE99999999999999999999","Outgoing Transfer","Muster payment","Income","-12.34","","",""
+    """
+
+    def summarized(**kwargs):
+        importer = N26Importer(
+            IBAN_NUMBER,
+            "Assets:N26",
+            summary_period="quarter",
+            opening_balance=lambda filepath: Decimal("0"),
+            **kwargs,
+        )
+
+        return importer, importer.extract(filename)
+
+    importer, expected = summarized()
+    cached, entries = summarized(extract_cache=str(tmp_path / "cache"))
+
+    assert entries == expected
+    assert summarized(extract_cache=str(tmp_path / "cache"))[1] == expected
+    assert importer.extract_sharded(filename, workers=1, shards=2) == expected
+    assert [b.date for b in expected if isinstance(b, data.Balance)] == [
+        datetime.date(2020, 1, 1)
+    ]
+
+    # shards extracted in this process don't leave stats of their own behind
+    sharded = N26Importer(
+        IBAN_NUMBER, "Assets:N26", summary_period="quarter", collect_stats=True
+    )
+    sharded.extract_sharded(filename, workers=1, shards=2)
+
+    assert sharded.stats == {}
+    assert sharded.summaries[filename].row_count == 4
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_summary_per_file(tmp_path, workers):
+    header = (
+        '"Date","Payee","Account number","Transaction type","Payment reference",'
+        '"Category","Amount (EUR)","Amount (Foreign Currency)",'
+        '"Type Foreign Currency","Exchange Rate"\n'
+    )
+    rows = [
+        '"2019-10-31","Cafe","DE99999999999999999999",'
+        '"Outgoing Transfer","Coffee","Food","-3.50","","",""\n',
+        '"2019-11-01","Landlord","DE99999999999999999999",'
+        '"Outgoing Transfer","Rent","Rent","-500.00","","",""\n',
+        '"2019-12-01","Landlord","DE99999999999999999999",'
+        '"Outgoing Transfer","Rent","Rent","-500.00","","",""\n',
+    ]
+
+    october = tmp_path / "october.csv"
+    october.write_text(header + rows[0] + rows[1])
+    november = tmp_path / "november.csv"
+    november.write_text(header + rows[1] + rows[2])
+
+    importer = N26Importer(
+        IBAN_NUMBER,
+        "Assets:N26",
+        fingerprint_index=str(tmp_path / "index.sqlite"),
+        summary_period="month",
+        opening_balance={
+            str(october): Decimal("1000.00"),
+            str(november): Decimal("996.50"),
+        },
+    )
+
+    results = importer.extract_many([str(october), str(november)], workers=workers)
+    balances = [
+        [
+            (entry.date, entry.amount.number)
+            for entry in result.entries
+            if isinstance(entry, data.Balance)
+        ]
+        for result in results
+    ]
+
+    # the rent of November has been extracted from the first file already, but not
+    # the assertion that follows it
+    assert balances == [
+        [(datetime.date(2019, 11, 1), Decimal("996.50"))],
+        [(datetime.date(2019, 12, 1), Decimal("496.50"))],
+    ]
+    assert [len(result.entries) for result in results] == [3, 2]
+    assert importer.summaries[str(november)].balance == Decimal("-3.50")
+
+
+@pytest.fixture
+def spawn():
+    # the default start method on macOS, and forkserver (on Linux since Python 3.14)
+    # pickles the arguments of workers the same way
+    method = multiprocessing.get_start_method(allow_none=True)
+    multiprocessing.set_start_method("spawn", force=True)
+
+    yield multiprocessing.get_context("spawn")
+
+    multiprocessing.set_start_method(method, force=True)
+
+
+def test_summary_spawned_workers(spawn, filename):
+    """\
+    "Date","Payee","Account number","Transaction type","Payment reference","Category","Amount (EUR)","Amount (Foreign Currency)","Type Foreign Currency","Exchange Rate"
+    "2019-12-28","MAX MUSTERMANN","DE99999999999999999999","Income","Muster GmbH","Income","1000.00","","",""
+    "2020-01-05","Muster GmbH","DE99999999999999999999","Outgoing Transfer","Muster payment","Income","-42.24","","",""
+    """
+
+    importer = N26Importer(
+        IBAN_NUMBER,
+        "Assets:N26",
+        summary_period="month",
+        opening_balance=lambda filepath: Decimal("100.00"),
+    )
+
+    expected = importer.extract(filename)
+    results = importer.extract_many([filename, filename], workers=2)
+
+    assert [result.error for result in results] == [None, None]
+    assert [result.entries for result in results] == [expected, expected]
+    assert isinstance(expected[-1], data.Balance)
+
+    async def main():
+        with ProcessPoolExecutor(max_workers=1, mp_context=spawn) as executor:
+            return await importer.aextract(filename, executor=executor)
+
+    assert asyncio.run(main()) == expected
+    assert importer.summaries[filename].balance == Decimal("1057.76")
+
+
+def test_summary_period():
+    with pytest.raises(ValueError):
+        N26Importer(IBAN_NUMBER, "Assets:N26", summary_period="fortnight")
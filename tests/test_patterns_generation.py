@@ -0,0 +1,156 @@
+import datetime
+import json
+from textwrap import dedent
+
+import pytest
+
+from beancount_n26 import N26Importer
+from beancount_n26.utils import patterns_generation
+from beancount_n26.utils.patterns_generation import (
+    generate_account_to_payees,
+    generate_mappings,
+    generate_payees_to_account,
+    load_account_patterns,
+    load_payee_relation,
+)
+
+
+@pytest.fixture
+def ledger(tmp_path):
+    (tmp_path / "main.beancount").write_text(
+        dedent(
+            """
+            include "2020.beancount"
+
+            2020-01-01 open Assets:N26
+            2020-01-01 open Expenses:Food
+            2020-01-01 open Expenses:Drinks
+            2020-01-01 open Income:Salary
+
+            2020-01-02 * "REWE" "Groceries"
+              Assets:N26  -10.00 EUR
+              Expenses:Food
+            """
+        )
+    )
+    (tmp_path / "2020.beancount").write_text(
+        dedent(
+            """
+            2020-01-03 * "Rewe" "Groceries"
+              Assets:N26  -12.00 EUR
+              Expenses:Food
+
+            2020-01-04 * "Rewe" "Beer"
+              Assets:N26  -5.00 EUR
+              Expenses:Drinks
+
+            2020-01-31 * "Muster GmbH (Payroll)" "Salary"
+              Assets:N26  1000.00 EUR
+              Income:Salary
+
+            2020-01-31 * "Interest"
+              Assets:N26  0.01 EUR
+              Income:Salary
+            """
+        )
+    )
+
+    return str(tmp_path / "main.beancount")
+
+
+@pytest.fixture
+def filename(request, tmp_path):
+    with open(tmp_path / "input.csv", "w") as file:
+        file.write(dedent(request.function.__doc__))
+        return file.name
+
+
+def test_generate_mappings(ledger, tmp_path):
+    generate_payees_to_account(ledger, str(tmp_path / "payees.json"))
+    generate_account_to_payees(ledger, str(tmp_path / "accounts.json"))
+
+    with open(tmp_path / "payees.json") as f:
+        assert json.load(f) == {
+            "rewe": ["Expenses:Drinks", "Expenses:Food"],
+            "muster gmbh (payroll)": ["Income:Salary"],
+            "null": ["Income:Salary"],
+        }
+
+    with open(tmp_path / "accounts.json") as f:
+        assert json.load(f) == {
+            "Expenses:Food": ["rewe"],
+            "Expenses:Drinks": ["rewe"],
+            "Income:Salary": ["muster gmbh (payroll)"],
+        }
+
+
+def test_load_payee_relation_cache(ledger, tmp_path, monkeypatch):
+    cache_file = str(tmp_path / "cache.json")
+
+    relation = load_payee_relation(ledger, cache_file=cache_file)
+    assert relation[("rewe", "Expenses:Food")] == (2, datetime.date(2020, 1, 3))
+
+    def fail(*args, **kwargs):
+        raise AssertionError("The ledger should not be loaded again")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(patterns_generation.loader, "load_file", fail)
+        assert load_payee_relation(ledger, cache_file=cache_file) == relation
+
+    with open(tmp_path / "2020.beancount", "a") as f:
+        f.write('\n2020-02-01 * "Rewe" "Groceries"\n  Assets:N26  -1 EUR\n')
+        f.write("  Expenses:Food\n")
+
+    relation = load_payee_relation(ledger, cache_file=cache_file)
+    assert relation[("rewe", "Expenses:Food")] == (3, datetime.date(2020, 2, 1))
+
+
+def test_account_patterns(ledger, tmp_path, filename):
+    """\
+    "Date","Payee","Account number","Transaction type","Payment reference","Category","Amount (EUR)","Amount (Foreign Currency)","Type Foreign Currency","Exchange Rate"
+    "2020-02-02","REWE Markt","DE99999999999999999999","Outgoing Transfer","Groceries","Food","-12.34","","",""
+    "2020-02-28","Muster GmbH (Payroll)","DE99999999999999999999","Income","Salary","Income","1000.00","","",""
+    """
+
+    patterns_file = str(tmp_path / "patterns.json")
+    generate_mappings(ledger, patterns_file=patterns_file)
+
+    account_patterns = load_account_patterns(patterns_file)
+
+    assert account_patterns == {
+        "Income:Salary": [r"muster\ gmbh\ \(payroll\)"],
+        "Expenses:Food": ["rewe"],
+    }
+
+    importer = N26Importer("DE99", "Assets:N26", account_patterns=account_patterns)
+
+    assert [entry.postings[1].account for entry in importer.extract(filename)] == [
+        "Expenses:Food",
+        "Income:Salary",
+    ]
+
+
+def test_payee_history(ledger, tmp_path, filename):
+    """\
+    "Date","Payee","Account number","Transaction type","Payment reference","Category","Amount (EUR)","Amount (Foreign Currency)","Type Foreign Currency","Exchange Rate"
+    "2020-02-02","REWE","DE99999999999999999999","Outgoing Transfer","Groceries","Food","-12.34","","",""
+    "2020-02-28","Muster GmbH Payroll","DE99999999999999999999","Income","Salary","Income","1000.00","","",""
+    "2020-02-28","Unknown","DE99999999999999999999","Outgoing Transfer","???","Misc","-1.00","","",""
+    """
+
+    history_file = str(tmp_path / "history.gz")
+    generate_mappings(ledger, history_file=history_file)
+
+    importer = N26Importer(
+        "DE99",
+        "Assets:N26",
+        account_patterns={"Expenses:Misc": ["rewe", "unknown"]},
+        payee_history=history_file,
+    )
+
+    assert importer.payee_history_path == history_file
+    assert [entry.postings[1].account for entry in importer.extract(filename)] == [
+        "Expenses:Food",
+        "Income:Salary",
+        "Expenses:Misc",
+    ]